@@ -32,6 +32,8 @@ contract Distributor is IBase, IDistributor
     uint constant ERROR_ALL_TOKENS_MINTED                    = 304;
     uint constant ERROR_WHITELIST_LIMIT_EXCEEDED             = 305;
     uint constant ERROR_SALE_NOT_ACTIVE                      = 306;
+    uint constant ERROR_ARRAYS_LENGTH_MISMATCH               = 307;
+    uint constant ERROR_TOKENS_START_MISMATCH                = 308;
 
 
     //========================================
@@ -97,13 +99,43 @@ contract Distributor is IBase, IDistributor
         mintedAmount      = _mintedAmount;
         tokens            = (includeTokens ? _tokens       : emptyS);
         tokensMinted      = (includeTokens ? _tokensMinted : emptyS);
-        tokensAmount      = tokens.length;
+        tokensAmount      = _tokens.length;
         tokensLocked      = _tokensLocked;
         whitelist         = (includeWhitelist ? _whitelist : emptyM);
         whitelistCount    = _whitelistCount;
         whitelistBuyLimit = _whitelistBuyLimit;
     }
 
+    function getTokens(uint256 start, uint256 count) external view override returns(string[] tokens, uint256 tokensAmount)
+    {
+        uint256 end = math.min(start + count, _tokens.length);
+        for(uint256 i = start; i < end; i++)
+        {
+            tokens.push(_tokens[i]);
+        }
+        tokensAmount = _tokens.length;
+    }
+
+    function getTokensDigests(uint256 start, uint256 count, uint256 chunkSize) external view override returns(uint256[] digests, uint256 tokensAmount)
+    {
+        require(chunkSize > 0, ERROR_TOKEN_INDEX_OUT_OF_RANGE);
+
+        uint256 end = math.min(start + count, _tokens.length);
+        for(uint256 chunkStart = start; chunkStart < end; chunkStart += chunkSize)
+        {
+            uint256 chunkEnd = math.min(chunkStart + chunkSize, end);
+            uint256 digest   = 0;
+            for(uint256 i = chunkStart; i < chunkEnd; i++)
+            {
+                TvmBuilder token;  token.store(_tokens[i]);
+                TvmBuilder fold;   fold.store(digest, tvm.hash(token.toCell()));
+                digest = sha256(fold.toSlice());
+            }
+            digests.push(digest);
+        }
+        tokensAmount = _tokens.length;
+    }
+
     //========================================
     //
     function calculateFutureCollectionAddress(uint256 nonce) private inline view returns (address, TvmCell)
@@ -288,11 +320,25 @@ contract Distributor is IBase, IDistributor
     function setToken(uint256 index, string metadata) external override onlyOwner reserve returnChange
     {
         require(!_tokensLocked,          ERROR_TOKENS_LOCKED           );        
-        require(_tokens.length >= index, ERROR_TOKEN_INDEX_OUT_OF_RANGE);
+        require(index < _tokens.length,  ERROR_TOKEN_INDEX_OUT_OF_RANGE);
 
         _tokens[index] = metadata;
     }
     
+    //========================================
+    //
+    function setTokens(uint256[] indices, string[] metadatas) external override onlyOwner reserve returnChange
+    {
+        require(!_tokensLocked,                       ERROR_TOKENS_LOCKED         );
+        require(indices.length == metadatas.length,   ERROR_ARRAYS_LENGTH_MISMATCH);
+
+        for(uint256 i = 0; i < indices.length; i++)
+        {
+            require(indices[i] < _tokens.length, ERROR_TOKEN_INDEX_OUT_OF_RANGE);
+            _tokens[indices[i]] = metadatas[i];
+        }
+    }
+    
     //========================================
     // 
     function addTokens(string[] metadatas) external override onlyOwner reserve returnChange
@@ -305,6 +351,19 @@ contract Distributor is IBase, IDistributor
         }        
     }
     
+    //========================================
+    // 
+    function addTokensAt(uint256 start, string[] metadatas) external override onlyOwner reserve returnChange
+    {
+        require(!_tokensLocked,          ERROR_TOKENS_LOCKED        );
+        require(_tokens.length == start, ERROR_TOKENS_START_MISMATCH);
+
+        for(string metadata : metadatas)
+        {
+            _tokens.push(metadata);
+        }
+    }
+    
     //========================================
     //
     function lockTokens() external override onlyOwner reserve returnChange
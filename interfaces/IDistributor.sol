@@ -37,6 +37,24 @@ interface IDistributor
         uint256   whitelistCount,
         uint32    whitelistBuyLimit);
     
+    //========================================
+    /// @notice Getter, returns a page of token metadata list;
+    ///
+    /// @param start - Index of the first token;
+    /// @param count - Maximum number of tokens to return;
+    //
+    function getTokens(uint256 start, uint256 count) external view returns(string[] tokens, uint256 tokensAmount);
+
+    //========================================
+    /// @notice Getter, returns digests of token metadata ranges to compare them without downloading;
+    ///         Every chunk is folded as "digest = sha256(digest . tvm.hash(cell with metadata ref))" starting from 0;
+    ///
+    /// @param start     - Index of the first token;
+    /// @param count     - Number of tokens to cover;
+    /// @param chunkSize - Number of tokens per digest;
+    //
+    function getTokensDigests(uint256 start, uint256 count, uint256 chunkSize) external view returns(uint256[] digests, uint256 tokensAmount);
+    
     //========================================
     /// @notice Changes Distributor parameters;
     ///
@@ -90,6 +108,14 @@ interface IDistributor
     //
     function setToken(uint256 index, string metadata) external;
     
+    //========================================
+    /// @notice Sets several token metadatas at once (tokens should already be added to the list);
+    ///
+    /// @param indices   - Token indexes to change;
+    /// @param metadatas - New token metadatas, one per index;
+    //
+    function setTokens(uint256[] indices, string[] metadatas) external;
+    
     //========================================
     /// @notice Adds specified entries to token metadata list;
     ///
@@ -97,6 +123,15 @@ interface IDistributor
     //
     function addTokens(string[] metadatas) external;
     
+    //========================================
+    /// @notice Adds specified entries to token metadata list only if it currently has exactly "start" entries,
+    ///         so batches that arrive out of order are rejected instead of being appended in the wrong place;
+    ///
+    /// @param start     - Expected current length of token metadata list;
+    /// @param metadatas - List of metadatas to add;
+    //
+    function addTokensAt(uint256 start, string[] metadatas) external;
+    
     //========================================
     /// @notice Locks token list, it won't be able to be changed anymore. 
     ///         Mint is available only after locking;
@@ -0,0 +1,140 @@
+#!/usr/bin/env python3
+
+# ==============================================================================
+#
+import os
+import re
+import json
+import hashlib
+import freeton_utils
+from   freeton_utils import dumpMetadata
+from   ipfs_utils    import hashFilesConcurrently, UPLOAD_WORKERS
+
+# ==============================================================================
+#
+MANIFEST_FILE    = ".asset_manifest.json"
+MANIFEST_VERSION = 2
+ASSET_NAME       = re.compile(r"^(\d+)\.(json|png)$")
+
+# ==============================================================================
+# Index of an asset folder ("N.json" + "N.png" pairs) built with one os.scandir pass.
+# Every file is recorded with size, mtime and hashes; JSON files also keep their
+# re-serialized metadata. The manifest is persisted in the folder and entries are reused
+# while size and mtime are unchanged, so only new or modified files are read again.
+class AssetManifest(object):
+    def __init__(self, assetFolder: str, workers: int = UPLOAD_WORKERS):
+        self.FOLDER   = assetFolder
+        self.PATH     = os.path.join(assetFolder, MANIFEST_FILE)
+        self.WORKERS  = workers
+        self.ENTRIES  = {}     # file name -> {"size", "mtime", "sha256", ["cid"], ["metadata", "defaultSize", "image"]}
+        self.COUNT    = 0      # number of consecutive pairs starting from 0
+        self.UNPAIRED = None   # first index that has only one of the files
+        self.refresh()
+
+    # ========================================
+    #
+    def refresh(self):
+        previous = self._load()
+        entries  = {}
+        changed  = False
+        media    = []
+
+        with os.scandir(self.FOLDER) as it:
+            for entry in it:
+                if not ASSET_NAME.match(entry.name) or not entry.is_file():
+                    continue
+                stat   = entry.stat()
+                cached = previous.get(entry.name)
+                if cached is not None and cached["size"] == stat.st_size and cached["mtime"] == stat.st_mtime_ns:
+                    entries[entry.name] = cached
+                    continue
+
+                changed = True
+                record  = {"size": stat.st_size, "mtime": stat.st_mtime_ns}
+                if entry.name.endswith(".json"):
+                    with open(entry.path, "rb") as fp:
+                        data = fp.read()
+                    meta = json.loads(data)
+                    record["sha256"]      = hashlib.sha256(data).hexdigest()
+                    record["metadata"]    = dumpMetadata(meta)
+                    record["defaultSize"] = len(dumpMetadata(meta, compact=False).encode("utf-8"))
+                    record["image"]       = meta.get("image", "")
+                else:
+                    media.append(entry.name)
+                entries[entry.name] = record
+
+        # Media is hashed together so that big folders use all workers
+        paths = [os.path.join(self.FOLDER, name) for name in media]
+        for path, (sha, cid) in hashFilesConcurrently(paths, self.WORKERS).items():
+            entries[os.path.basename(path)]["sha256"] = sha
+            entries[os.path.basename(path)]["cid"]    = cid
+
+        if changed or len(entries) != len(previous):
+            self._save(entries)
+
+        self.ENTRIES  = entries
+        self.COUNT    = 0
+        self.UNPAIRED = None
+        while True:
+            num = (1 if str(self.COUNT) + ".json" in entries else 0) + (1 if str(self.COUNT) + ".png" in entries else 0)
+            if num == 2:
+                self.COUNT += 1
+            else:
+                self.UNPAIRED = self.COUNT if num == 1 else None
+                break
+
+    # ========================================
+    #
+    def metadataPath(self, index: int):
+        return os.path.join(self.FOLDER, str(index) + ".json")
+
+    def mediaPath(self, index: int):
+        return os.path.join(self.FOLDER, str(index) + ".png")
+
+    # Metadata as it is uploaded on-chain (dumpMetadata of the parsed file)
+    def dumpedMetadata(self, index: int):
+        return self.ENTRIES[str(index) + ".json"]["metadata"]
+
+    # Size of the same metadata with the default (non-compact) encoding
+    def defaultMetadataSize(self, index: int):
+        return self.ENTRIES[str(index) + ".json"]["defaultSize"]
+
+    def image(self, index: int):
+        return self.ENTRIES[str(index) + ".json"]["image"]
+
+    # Metadata as it is in the file
+    def metadata(self, index: int):
+        with open(self.metadataPath(index)) as fp:
+            return json.load(fp)
+
+    # path -> (sha256, CIDv0) of media, in the format of ipfs_utils.hashFilesConcurrently
+    def mediaDigests(self, indexes):
+        return {self.mediaPath(i): (self.ENTRIES[str(i) + ".png"]["sha256"], self.ENTRIES[str(i) + ".png"]["cid"]) for i in indexes}
+
+    # ========================================
+    #
+    def _encoding(self):
+        return {"compact": freeton_utils.METADATA_COMPACT, "omitEmpty": freeton_utils.METADATA_OMIT_EMPTY}
+
+    # Stored metadata depends on the encoding mode, JSON entries are read again when it changes
+    def _load(self):
+        try:
+            with open(self.PATH) as fp:
+                manifest = json.load(fp)
+        except (OSError, ValueError):
+            return {}
+        if manifest.get("version") != MANIFEST_VERSION:
+            return {}
+        entries = manifest.get("entries", {})
+        if manifest.get("encoding") != self._encoding():
+            entries = {name: entry for name, entry in entries.items() if not name.endswith(".json")}
+        return entries
+
+    def _save(self, entries):
+        temp = self.PATH + ".tmp"
+        with open(temp, "w") as fp:
+            json.dump({"version": MANIFEST_VERSION, "encoding": self._encoding(), "entries": entries}, fp)
+        os.replace(temp, self.PATH)
+
+# ==============================================================================
+#
@@ -11,17 +11,20 @@ import random
 import freeton_utils
 from   freeton_utils                import *
 from   pinatapy                     import PinataPy
+from   ipfs_utils                   import *
+from   asset_manifest               import AssetManifest
 from   pprint                       import pprint
 from   contract_Distributor         import Distributor
-from   contract_LiquidNFT           import LiquidNFT
-from   contract_LiquidNFTCollection import LiquidNFTCollection
+from   contract_LiquidToken         import LiquidToken
+from   contract_LiquidCollection    import LiquidCollection
 from   contract_DistributorDebot    import DistributorDebot
+from   freeton_sandbox              import SandboxClient
 
 # ==============================================================================
 # 
 def getClient():
-    return TonClient(config=ClientConfig(network=NetworkConfig(endpoints=getApiEndpoints(True))))
-    #return TonClient(config=ClientConfig(network=NetworkConfig(server_address="https://gql.custler.net")))
+    return getEverClient(testnet=True)
+    #return getEverClient(testnet=True, customServer="https://gql.custler.net")
 
 # ==============================================================================
 # 
@@ -29,6 +32,8 @@ distributorConfig = {
     "nonce": 0,
     "pinata_api_key": "",
     "pinata_secret_api_key": "",
+    "metadata_compact": False,
+    "metadata_omit_empty": False,
     "creatorAddress": "",
     "ownerAddress": "",
     "ownerPubkey": "",
@@ -88,10 +93,8 @@ def walletDeployed() -> bool:
 # ==============================================================================
 # 
 def getDistributor() -> Distributor:
-    msig = getWallet()
-    with open("config.json") as f:
-        data = f.read()
-    config = ast.literal_eval(data)
+    msig   = getWallet()
+    config = getDistributorConfig()  # Applies metadata encoding mode for every command that touches Distributor
 
     distributor = Distributor(everClient                    = getClient(), 
                               nonce                         = config["nonce"], 
@@ -148,37 +151,58 @@ def getDistributorConfig():
     with open("config.json") as f:
         data = f.read()
     config = ast.literal_eval(data)
+
+    # Metadata encoding mode is a part of the config, all commands must upload and compare the same strings
+    freeton_utils.METADATA_COMPACT    = config.get("metadata_compact",    False)
+    freeton_utils.METADATA_OMIT_EMPTY = config.get("metadata_omit_empty", False)
     return config
 
 # ==============================================================================
 #
-def getNumberOfAssets(assetFolder: str) -> int:
-    count = 0
-    while True:
-        num = 0
-        num = num + (1 if os.path.exists(os.path.join(assetFolder, str(count) + ".json")) else 0)
-        num = num + (1 if os.path.exists(os.path.join(assetFolder, str(count) + ".png" )) else 0)
-        if num == 2:
-            count += 1
-        elif num == 1:
-            click.echo(f"ERROR!")
-            click.echo(f"JSON file count doesn't match PNG file count!")
-            click.echo(f"Aborting...")
-            quit()           
-        else:
-            break
+def getAssetManifest(assetFolder: str) -> AssetManifest:
+    manifest = AssetManifest(assetFolder)
+    if manifest.UNPAIRED is not None:
+        click.echo(f"ERROR!")
+        click.echo(f"JSON file count doesn't match PNG file count!")
+        click.echo(f"Aborting...")
+        quit()           
     
-    return count
+    return manifest
+
+# ==============================================================================
+#
+def reportMetadataSize(manifest: AssetManifest):
+    default   = estimateStringsFees([manifest.defaultMetadataSize(i) for i in range(0, manifest.COUNT)])
+    current   = estimateStringsFees([len(manifest.dumpedMetadata(i).encode("utf-8")) for i in range(0, manifest.COUNT)])
+    mode      = "compact" if freeton_utils.METADATA_COMPACT else "default"
+    click.echo(f"Metadata ({mode}): {current['bytes']} bytes in {current['cells']} cells, default encoding: {default['bytes']} bytes in {default['cells']} cells.")
+    if freeton_utils.METADATA_COMPACT:
+        click.echo(f"Saved {default['bytes'] - current['bytes']} bytes, ~{(default['fwdFee'] - current['fwdFee'])/EVER} EVER of forward fees and ~{(default['storageFee'] - current['storageFee'])/EVER} EVER of storage fees per year.")
+
+# ==============================================================================
+#
+def saveReport(telemetry: Telemetry, path: str):
+    report = telemetry.report()
+    for name, stage in report["stages"].items():
+        click.echo(f"{name:>8}: {stage['seconds']:.1f}s ({stage['latencySeconds']:.1f}s summed latency), {stage['items']} items ({stage['itemsPerSecond']:.1f}/s), {stage['bytes']} bytes ({stage['bytesPerSecond']:.0f} B/s)")
+    click.echo(f"Transactions: {report['transactions']} ({report['failedTransactions']} failed), fees: {report['fees']/EVER} EVER, {report['feesPerKB']/EVER} EVER per KB.")
+    telemetry.save(path)
+    click.echo(f"Report was saved to \"{path}\" file.")
 
 # ==============================================================================
 # ==============================================================================
 # ==============================================================================
 # 
 @click.group()
-def cli():
+@click.option("--sandbox", "sandbox_state", type=str, default=None, help="Run against a local sandbox blockchain stored in the given file.")
+@click.pass_context
+def cli(ctx, sandbox_state):
     """
     This is a CLI for Distributor creation and management.
     """
+    if sandbox_state is not None:
+        freeton_utils.BACKEND = SandboxClient(stateFile=sandbox_state)
+        ctx.call_on_close(freeton_utils.BACKEND.save)
 
 # ==============================================================================
 # 
@@ -247,6 +271,22 @@ def wallet():
     status = "Deployed" if walletDeployed() else "Not deployed"
     click.echo(f"Contract: SetcodeMultisigWallet.sol\n Address: {msig.ADDRESS}\n Balance: {int(msig.getBalance())/EVER} EVER\n  Status: {status}")
 
+# ==============================================================================
+# 
+@cli.command()
+@click.argument("amount", type=int)
+def topup(amount):
+    """
+    Tops up Wallet from the local giver (sandbox only), amount is in nanoevers.
+    """
+    if freeton_utils.BACKEND is None:
+        click.echo(f"Top up is only available with \"--sandbox\" option.")
+        return
+
+    msig = getWallet()
+    freeton_utils.BACKEND.topUp(msig.ADDRESS, amount)
+    click.echo(f"Wallet {msig.ADDRESS} balance: {int(msig.getBalance())/EVER} EVER")
+
 # ==============================================================================
 # 
 @cli.command()
@@ -315,11 +355,17 @@ def change(price, sale_start_date, presale_start_date):
     distributor.change(msig = msig, saleStartDate = sale_start_date, presaleStartDate = presale_start_date, price = price)
 
 # ==============================================================================
-# TODO: show progress of upload
-# TODO: upload multiple metadatas at once
 @cli.command()
 @click.argument("asset_folder", type=str)
-def upload(asset_folder):
+@click.option("-w", "--workers", "workers", type=int, default=UPLOAD_WORKERS, help="Number of concurrent IPFS uploads.")
+@click.option("-d", "--directory", "directory", is_flag=True, default=False, help="Pin all media as one IPFS directory in a single request.")
+@click.option("--check-pins", "checkPins", is_flag=True, default=False, help="Ask Pinata whether media is already pinned instead of trusting the local hash index (one extra API call per file).")
+@click.option("-m", "--margin", "margin", type=float, default=0.1, help="Share of the message size and gas limits kept free in addTokens batches.")
+@click.option("--window", "window", type=int, default=8, help="Number of multisig transactions kept in flight.")
+@click.option("--batch-bytes", "batchBytes", type=int, default=0, help="Maximum metadata bytes per addTokens batch, 0 for no limit besides measured gas and the message size.")
+@click.option("--batch-items", "batchItems", type=int, default=0, help="Maximum metadatas per addTokens batch, 0 for no limit besides measured gas and the message size.")
+@click.option("-r", "--report", "report", type=str, default=None, help="Path of the JSON run report (default: upload_report.json in the asset folder).")
+def upload(asset_folder, workers, directory, checkPins, margin, window, batchBytes, batchItems, report):
     """
     Uploads media and metadata from a specific folder to IPFS and blockchain respectively.
     """
@@ -332,80 +378,89 @@ def upload(asset_folder):
     if not distributorDeployed():
         return
 
-    numAssets = getNumberOfAssets(asset_folder)
+    telemetry = Telemetry()
+    report    = os.path.join(asset_folder, "upload_report.json") if report is None else report
     config    = getDistributorConfig() 
+    with telemetry.stage("manifest"):
+        manifest = getAssetManifest(asset_folder)
+    numAssets = manifest.COUNT
+    telemetry.add("manifest", items=numAssets)
     pinata    = PinataPy(pinata_api_key = config["pinata_api_key"], pinata_secret_api_key = config["pinata_secret_api_key"])
 
-    # Upload files to IPFS first
+    # Upload files to IPFS first, finished uploads are journaled so that an interrupted run resumes
     click.echo(f"Checking IPFS uploads...")
 
-    for i in range(0, numAssets):
-        with open(os.path.join(asset_folder, str(i) + ".json")) as f:
-            data = f.read()
-        meta = json.loads(data)
+    pending   = [i for i in range(0, numAssets) if manifest.image(i) == ""]
+    mediaSize = sum(manifest.ENTRIES[str(i) + ".png"]["size"] for i in pending)
+
+    journal = UploadJournal(os.path.join(asset_folder, UPLOAD_JOURNAL))
+    index   = UploadJournal(config.get("ipfs_hash_index", getHashIndexPath(config["pinata_api_key"])), keyField="sha256")
+    if directory:
+        # Directory URIs are "<dirCID>/N.png", all media goes into the directory and every JSON is rewritten
+        allMedia = [manifest.mediaPath(i) for i in range(0, numAssets)]
+        errors   = []
+        digests  = manifest.mediaDigests(range(0, numAssets))
+        if any("/" not in (journal.get(os.path.basename(path), digests[path][0]) or "") for path in allMedia):
+            click.echo(f"Uploading {numAssets} media files to IPFS as one directory...")
+            with telemetry.stage("ipfs", items=numAssets, size=sum(manifest.ENTRIES[str(i) + ".png"]["size"] for i in range(0, numAssets))):
+                errors = pinDirectory(pinata, allMedia, journal, os.path.basename(os.path.normpath(asset_folder)), digests=digests)
+        pending = list(range(0, numAssets)) if len(errors) == 0 else []
+    else:
+        with click.progressbar(length=len(pending), label="Uploading media to IPFS") as bar, telemetry.stage("ipfs", items=len(pending), size=mediaSize):
+            errors = pinFilesConcurrently(pinata, [manifest.mediaPath(i) for i in pending], journal, workers=workers, onProgress=bar.update, index=index, digests=manifest.mediaDigests(pending), checkPinned=checkPins)
+
+    with telemetry.stage("rewrite", items=len(pending)):
+        for i in pending:
+            ipfsHash = journal.get(str(i) + ".png", manifest.ENTRIES[str(i) + ".png"]["sha256"])
+            if ipfsHash is None:
+                continue
 
-        if meta["image"] == "":
-            result = pinata.pin_file_to_ipfs(os.path.join(asset_folder, str(i) + ".png"))
-            if "IpfsHash" not in result:
-                click.echo(f"IPFS upload error! Please check config and run CLI again.")
-                click.echo(f"Error message: {result}")
-                quit()
+            jsonFile = manifest.metadataPath(i)
+            meta     = manifest.metadata(i)
 
-            meta["image"]                          = "https://gateway.pinata.cloud/ipfs/" + result["IpfsHash"]
-            meta["properties"]["files"][0]["uri"]  = "https://gateway.pinata.cloud/ipfs/" + result["IpfsHash"]
+            meta["image"]                          = IPFS_GATEWAY + ipfsHash
+            meta["properties"]["files"][0]["uri"]  = IPFS_GATEWAY + ipfsHash
             meta["properties"]["files"][0]["type"] = "image/png"
             meta["properties"]["category"]         = "image"
 
-            jsonFile = os.path.join(asset_folder, str(i) + ".json")
             with open(jsonFile, "w") as fp:
                 json.dump(meta, fp)
+        journal.close()
+        index.close()
+        manifest.refresh()
+
+    if len(errors) > 0:
+        click.echo(f"IPFS upload error! Please check config and run CLI again.")
+        click.echo(f"Error message: {errors[0][1]}")
+        saveReport(telemetry, report)
+        quit()
 
     # Upload metadatas to blockchain next, start where we left off (check current Distributor contents)
     msig        = getWallet()
     distributor = getDistributor()
-    info        = distributor.getInfo(includeTokens = True, includeWhitelist = False)
-    metadatas   = info["tokens"]
-    
-    # Check that all uploaded metadatas are correct
-    click.echo(f"Checking current on-chain metadatas...")
 
-    for i in range(0, len(metadatas)):
-        with open(os.path.join(asset_folder, str(i) + ".json")) as f:
-            data = f.read()
-        meta   = json.loads(data)
-        dumped = json.dumps(meta)
-        if metadatas[i] != dumped:
-            click.echo(f"Metadata mismatch! Index: {i}\n Metadata local: {dumped}\nMetadata remote: {metadatas[i]}")
-            click.echo(f"Updating...")
-            distributor.setToken(msig=msig, index=i, metadata=dumped)
-    
-    # Upload the remaining
-    click.echo(f"Uploading remaining metadatas...")
-    metadatasBatch = []
-    batchSize = 0
-    for i in range(len(metadatas), numAssets):
-        with open(os.path.join(asset_folder, str(i) + ".json")) as f:
-            data = f.read()
-        meta   = json.loads(data)
-        dumped = json.dumps(meta)
-        #distributor.addTokens(msig=msig, metadatas=[dumped])
-
-        # create a batch and cap at 12KB, when target capacity is reached upload it to blockchain
-        metadatasBatch.append(dumped)
-        batchSize += len(dumped)
-        if batchSize > 12000:
-            click.echo(f"Uploadting a batch of {len(metadatasBatch)} metadatas...")
-            result = distributor.addTokens(msig=msig, metadatas=metadatasBatch)
-            metadatasBatch = []
-            batchSize = 0
-
-    if batchSize > 0:
-        click.echo(f"Uploadting a batch of {len(metadatasBatch)} metadatas...")
-        distributor.addTokens(msig=msig, metadatas=metadatasBatch)
-        metadatasBatch = []
-        batchSize = 0
-    
+    expected = [manifest.dumpedMetadata(i) for i in range(0, numAssets)]
+    reportMetadataSize(manifest)
+
+    # Batches are packed up to the gas measured on the Distributor's account and pipelined, on-chain order is verified and repaired
+    click.echo(f"Uploading metadatas...")
+    onBatch = lambda functionName, count: click.echo(f"Uploading a batch of {count} metadatas ({functionName})...")
+    try:
+        uploaded = distributor.uploadTokens(msig=msig, metadatas=expected, window=window, margin=margin, onBatch=onBatch, telemetry=telemetry, maxItems=batchItems or None, maxBytes=batchBytes or None)
+    except:
+        saveReport(telemetry, report)
+        raise
+
+    if not uploaded:
+        if distributor.getTokensAmount() > len(expected):
+            click.echo(f"Distributor has more tokens than the asset folder, delete tokens before uploading.")
+        else:
+            click.echo(f"Upload was not finished properly, please run CLI again.")
+        saveReport(telemetry, report)
+        quit()
+
     click.echo(f"Upload complete!")
+    saveReport(telemetry, report)
 
 # ==============================================================================
 # 
@@ -419,30 +474,29 @@ def verify(asset_folder):
     click.echo(f"Starting verification...")
 
     distributor = getDistributor()
-    info        = distributor.getInfo(includeTokens = True, includeWhitelist = False)
-    metadatas   = info["tokens"]
 
     # 1. check the numbers:
-    numAssets = getNumberOfAssets(asset_folder)
-    print(numAssets, len(metadatas))
+    manifest  = getAssetManifest(asset_folder)
+    numAssets = manifest.COUNT
+    expected  = [manifest.dumpedMetadata(i) for i in range(0, numAssets)]
+
+    # 2. compare chunk digests, only differing chunks are downloaded
+    (tokensAmount, mismatches) = distributor.getTokensMismatches(metadatas=expected)
 
-    if numAssets != len(metadatas):
+    if numAssets != tokensAmount:
         click.echo(f"Verification FAILED!")
         click.echo(f"Upload was not finished properly.")
         quit()
 
-    for i in range(0, numAssets):
-        with open(os.path.join(asset_folder, str(i) + ".json")) as f:
-            data = f.read()
-        meta   = json.loads(data)
-        dumped = json.dumps(meta)
-        if dumped != metadatas[i]:
+    if len(mismatches) > 0:
+        for i in mismatches:
             click.echo(f"Verification of asset {i} FAILED!")
-            click.echo(f"Upload was not finished properly.")
-            click.echo(f"Please run \"finalize\" command to lock Tokens and enable selling capabilities.")
+        click.echo(f"Upload was not finished properly.")
+        quit()
 
     click.echo(f"Verification is SUCCESSFUL!")
     click.echo(f"{numAssets} of {numAssets} assets uploaded correctly.")
+    click.echo(f"Please run \"finalize\" command to lock Tokens and enable selling capabilities.")
 
 # ==============================================================================
 # 
@@ -5,6 +5,38 @@
 import freeton_utils
 from   freeton_utils import *
 
+DIGEST_CHUNK_SIZE = 64    # Tokens folded into one digest
+DIGEST_PAGE_SIZE  = 256   # Tokens covered by one getTokensDigests call, a multiple of DIGEST_CHUNK_SIZE.
+                          # Every token builds two cells and reads the tokens dictionary; gas wasn't measured,
+                          # so pages that run out of gas are split in half and retried.
+
+BATCH_MAX_BYTES        = None  # Metadata bytes per addTokens/setTokens batch, None for no limit
+BATCH_MAX_ITEMS        = None  # Tokens per batch, None for no limit
+BATCH_UNMEASURED_ITEMS = 100   # Tokens per batch when gas can't be measured (no sender or no account yet).
+                               # Storing a token costs ~4.5K gas on an empty list and ~7K with 10K tokens
+                               # (run_executor on the shipped Distributor.tvc), the limit is 1M gas for 1 EVER.
+
+ERROR_WRONG_FUNCTION_ID = 60        # Compiler exit code for a function the deployed code doesn't have
+ERROR_OUT_OF_GAS        = [13, -14] # TVM exit codes of a computation that ran out of gas
+
+# ==============================================================================
+# Client side of Distributor.getTokensDigests: every chunk is folded as
+# digest = sha256(digest . hash(cell with metadata ref)), starting from zero.
+def calculateTokensDigests(metadatas: List[str], chunkSize: int = DIGEST_CHUNK_SIZE):
+    everClient = getOfflineClient()
+    digests    = []
+    for chunkStart in range(0, len(metadatas), chunkSize):
+        digest = bytes(32)
+        for metadata in metadatas[chunkStart:chunkStart + chunkSize]:
+            params   = ParamsOfAbiEncodeBoc(params=[AbiParam(name="metadata", type="string")], data={"metadata":metadata})
+            encoded  = everClient.abi.encode_boc(params=params)
+            cellHash = everClient.boc.get_boc_hash(params=ParamsOfGetBocHash(boc=encoded.boc)).hash
+            digest   = hashlib.sha256(digest + bytes.fromhex(cellHash)).digest()
+        digests.append(int.from_bytes(digest, "big"))
+    return digests
+
+# ==============================================================================
+#
 class Distributor(BaseContract):
     def __init__(self, everClient: TonClient, nonce: str, 
                                              creatorAddress: str,
@@ -27,7 +59,7 @@ class Distributor(BaseContract):
         self.CONSTRUCTOR = {"presaleStartDate":              presaleStartDate,
                             "saleStartDate":                 saleStartDate,
                             "price":                         price,
-                            "collectionMetadata":            json.dumps(collectionMetadata),
+                            "collectionMetadata":            dumpMetadata(collectionMetadata),
                             "tokenPrimarySaleHappened":      tokenPrimarySaleHappened,
                             "tokenMetadataIsMutable":        tokenMetadataIsMutable,
                             "tokenMasterEditionMaxSupply":   tokenMasterEditionMaxSupply,
@@ -42,6 +74,32 @@ class Distributor(BaseContract):
                             "_collectionCode": getCodeFromTvc("../bin/LiquidCollection.tvc"), 
                             "_tokenCode":      getCodeFromTvc("../bin/LiquidToken.tvc")}
         BaseContract.__init__(self, everClient=everClient, contractName="Distributor", pubkey=ZERO_PUBKEY, signer=genSigner)
+        self.LEGACY = None
+
+    #========================================
+    # Distributors built before getTokens/getTokensDigests/setTokens (every deployed one, and
+    # bin/Distributor.tvc until it is rebuilt together with its ABI) don't have them and their
+    # getInfo(includeTokens=false) returns tokensAmount = 0. Checked once: by the ABI and then by
+    # probing getTokens on the account.
+    def isLegacy(self):
+        if self.LEGACY is not None:
+            return self.LEGACY
+        if not abiHasFunction(self.ABI, "getTokens"):
+            self.LEGACY = True
+            return self.LEGACY
+
+        try:
+            result = self.getTokens(start=0, count=0)
+        except TonException as ever:
+            if getValuesFromException(ever)["errorCode"] != ERROR_WRONG_FUNCTION_ID:
+                raise
+            self.LEGACY = True
+            return self.LEGACY
+
+        if result == "":
+            return True  # Not deployed yet, check again later
+        self.LEGACY = False
+        return self.LEGACY
 
     #========================================
     #
@@ -77,10 +135,222 @@ class Distributor(BaseContract):
         result = self._callFromMultisig(msig=msig, functionName="setToken", functionParams={"index":index, "metadata":metadata}, value=EVER, flags=1)
         return result
 
-    def addTokens(self, msig: Multisig, metadatas: List[str]):
-        result = self._callFromMultisig(msig=msig, functionName="addTokens", functionParams={"metadatas":metadatas}, value=EVER, flags=1)
+    # With "start" the batch is rejected unless the Distributor has exactly "start" tokens
+    # (ignored on Distributors without addTokensAt)
+    def addTokens(self, msig: Multisig, metadatas: List[str], start: int = None):
+        (functionName, functionParams) = self._addTokensCall(metadatas=metadatas, start=start)
+        result = self._callFromMultisig(msig=msig, functionName=functionName, functionParams=functionParams, value=EVER, flags=1)
         return result
 
+    def _addTokensCall(self, metadatas: List[str], start: int = None):
+        if start is None or self.isLegacy() or not abiHasFunction(self.ABI, "addTokensAt"):
+            return ("addTokens", {"metadatas":metadatas})
+        return ("addTokensAt", {"start":start, "metadatas":metadatas})
+
+    def setTokens(self, msig: Multisig, indices: List[int], metadatas: List[str]):
+        result = self._callFromMultisig(msig=msig, functionName="setTokens", functionParams={"indices":indices, "metadatas":metadatas}, value=EVER, flags=1)
+        return result
+
+    # Splits items into consecutive batches of "functionName" calls as big as the encoded message allows.
+    # Every candidate batch is encoded offline and measured in cells/bits (see _splitBatches for the
+    # search). "margin" leaves room for the multisig wrapper and keeps batches away from the hard limits.
+    # Message limits don't bound gas, which runs out long before them: with "sender" (the owner
+    # multisig) every candidate is also executed locally on the Distributor's account BOC and has to
+    # leave "margin" of its gas limit. Every chosen batch is then applied to that local copy, storing
+    # a token gets more expensive as the list grows and the next batch is measured on the state it
+    # will land on. Without a sender or a deployed account batches are capped at
+    # BATCH_UNMEASURED_ITEMS. "maxItems" and "maxBytes" (metadata bytes, "itemBytes" of every item)
+    # are extra caps on top. "makeParams" is called again for every batch, after the previous one
+    # was consumed.
+    def _packBatches(self, items, functionName: str, makeParams, margin: float, itemBytes, maxItems: int = BATCH_MAX_ITEMS, maxBytes: int = BATCH_MAX_BYTES, sender: str = None):
+        maxCells   = int(MAX_MSG_CELLS * (1 - margin))
+        maxBits    = int(MAX_MSG_BITS  * (1 - margin))
+        everClient = getOfflineClient()
+        boc        = getAccountBoc(self.EVERCLIENT, self.ADDRESS) if sender is not None else ""
+        bocRef     = None
+        if boc == "":
+            maxItems = BATCH_UNMEASURED_ITEMS if maxItems is None else min(maxItems, BATCH_UNMEASURED_ITEMS)
+
+        # Pinned, so that every candidate doesn't pass the whole account BOC to the SDK again
+        def _pin(boc):
+            nonlocal bocRef
+            if bocRef is not None:
+                everClient.boc.cache_unpin(params=ParamsOfBocCacheUnpin(pin="packBatches", boc_ref=bocRef))
+            bocRef = everClient.boc.cache_set(params=ParamsOfBocCacheSet(boc=boc, cache_type=BocCacheType.Pinned(pin="packBatches"))).boc_ref
+
+        def _fits(batch):
+            if maxItems is not None and len(batch) > maxItems:
+                return False
+            if maxBytes is not None and sum(itemBytes(item) for item in batch) > maxBytes:
+                return False
+            params = makeParams(batch)
+            stats  = getBocStats(prepareMessageBoc(abiPath=self.ABI, functionName=functionName, functionParams=params))
+            if stats["cells"] > maxCells or stats["bits"] > maxBits:
+                return False
+            if bocRef is None:
+                return True
+            gas = estimateInternalGas(boc=bocRef, abiPath=self.ABI, contractAddress=self.ADDRESS, srcAddress=sender, functionName=functionName, functionParams=params, value=EVER)
+            return gas["exitCode"] not in ERROR_OUT_OF_GAS and gas["gasUsed"] <= gas["gasLimit"] * (1 - margin)
+
+        try:
+            if boc != "":
+                _pin(boc)
+            for batch in self._splitBatches(items, _fits):
+                if bocRef is not None:
+                    applied = estimateInternalGas(boc=bocRef, abiPath=self.ABI, contractAddress=self.ADDRESS, srcAddress=sender, functionName=functionName, functionParams=makeParams(batch), value=EVER, returnAccount=True)
+                    if applied["exitCode"] == 0:
+                        _pin(applied["account"])
+                yield batch
+        finally:
+            if bocRef is not None:
+                everClient.boc.cache_unpin(params=ParamsOfBocCacheUnpin(pin="packBatches", boc_ref=bocRef))
+
+    # Consecutive batches as big as "fits" allows. The search starts at the previous batch size and
+    # gallops up from it (or narrows down with a binary search), so neighbouring batches of similar
+    # items cost two checks each.
+    def _splitBatches(self, items, fits):
+        start = 0
+        hint  = 1
+        while start < len(items):
+            remaining = len(items) - start
+            size      = min(hint, remaining)
+            good      = 0
+            bad       = size
+            if fits(items[start:start + size]):
+                good = size
+                bad  = None
+                step = 1
+                while good < remaining:
+                    size = min(good + step, remaining)
+                    if not fits(items[start:start + size]):
+                        bad = size
+                        break
+                    good = size
+                    step = step * 2
+
+            while bad is not None and bad - good > 1:
+                middle = (good + bad) // 2
+                if fits(items[start:start + middle]):
+                    good = middle
+                else:
+                    bad = middle
+
+            # A single item that is too big on its own is still sent alone, the transaction reports the failure
+            count = max(good, 1)
+            hint  = count
+            yield items[start:start + count]
+            start += count
+
+    # Batches of metadatas for addTokens (addTokensAt with "start")
+    def packTokens(self, metadatas: List[str], margin: float = 0.1, start: int = None, maxItems: int = BATCH_MAX_ITEMS, maxBytes: int = BATCH_MAX_BYTES, sender: str = None):
+        (functionName, _) = self._addTokensCall(metadatas=[], start=start)
+        itemBytes  = lambda metadata: len(metadata.encode("utf-8"))
+        position   = start
+        makeParams = lambda batch: self._addTokensCall(metadatas=batch, start=position)[1]
+        for batch in self._packBatches(items=metadatas, functionName=functionName, makeParams=makeParams, margin=margin, itemBytes=itemBytes, maxItems=maxItems, maxBytes=maxBytes, sender=sender):
+            yield batch
+            if position is not None:
+                position += len(batch)
+
+    # Batches of (indices, metadatas) for setTokens
+    def packTokenFixes(self, indices: List[int], metadatas: List[str], margin: float = 0.1, maxItems: int = BATCH_MAX_ITEMS, maxBytes: int = BATCH_MAX_BYTES, sender: str = None):
+        makeParams = lambda batch: {"indices":[i for (i, _) in batch], "metadatas":[m for (_, m) in batch]}
+        itemBytes  = lambda item: len(item[1].encode("utf-8"))
+        for batch in self._packBatches(items=list(zip(indices, metadatas)), functionName="setTokens", makeParams=makeParams, margin=margin, itemBytes=itemBytes, maxItems=maxItems, maxBytes=maxBytes, sender=sender):
+            yield ([i for (i, _) in batch], [m for (_, m) in batch])
+
+    # (functionName, functionParams, metadatas) calls that overwrite tokens at "indices"
+    def _packTokenFixCalls(self, indices: List[int], metadatas: List[str], margin: float, maxItems: int = BATCH_MAX_ITEMS, maxBytes: int = BATCH_MAX_BYTES, sender: str = None):
+        if self.isLegacy() or not abiHasFunction(self.ABI, "setTokens"):
+            return [("setToken", {"index":index, "metadata":metadata}, [metadata]) for index, metadata in zip(indices, metadatas)]
+        return [("setTokens", {"indices":batchIndices, "metadatas":batch}, batch) for (batchIndices, batch) in self.packTokenFixes(indices=indices, metadatas=metadatas, margin=margin, maxItems=maxItems, maxBytes=maxBytes, sender=sender)]
+
+    # Runs (submit, size) calls through one pipeline that doesn't throw: failed and expired
+    # transactions come back as results, are counted in telemetry and left to the next round.
+    def _submitCalls(self, calls, window: int, telemetry: Telemetry):
+        if len(calls) == 0:
+            return []
+        with telemetry.stage("submit", items=len(calls), size=sum(size for (_, size) in calls)):
+            results = processMessagesAsync(everClient=self.EVERCLIENT, submitFunctions=[submit for (submit, _) in calls], window=window, telemetry=telemetry, throw=False)
+        for result, (_, size) in zip(results, calls):
+            telemetry.addTransaction(result, size)
+        return results
+
+    # Makes on-chain tokens equal to "metadatas" keeping several multisig transactions in flight.
+    # Multisig external messages may land in any order (or expire), so every round first reads the
+    # on-chain list back (by chunk digests): tokens at wrong positions are overwritten with packed
+    # setTokens batches (one setToken per token on Distributors without setTokens), the missing
+    # tail is appended with packed addTokens batches. Every batch carries the index it has to land
+    # at (addTokensAt), so a batch that overtakes the previous one bounces cheaply and the next
+    # round re-sends only the gaps instead of rewriting shuffled tokens. Distributors without
+    # addTokensAt get their batches one at a time, stopping at the first failed one; only the
+    # index-addressed fixes are sent in parallel there.
+    # Batches are sized by gas measured on the account of the Distributor ("maxItems"/"maxBytes" are
+    # extra caps, see _packBatches).
+    # Returns True when on-chain tokens match, False when they don't after "rounds" or when the
+    # Distributor already has more tokens than "metadatas".
+    def uploadTokens(self, msig: Multisig, metadatas: List[str], window: int = 8, margin: float = 0.1, rounds: int = 5, settleTimeout: int = 60, onBatch = None, telemetry: Telemetry = None, maxItems: int = BATCH_MAX_ITEMS, maxBytes: int = BATCH_MAX_BYTES):
+        telemetry = Telemetry() if telemetry is None else telemetry
+        for _ in range(0, rounds):
+            with telemetry.stage("verify", items=len(metadatas)):
+                (tokensAmount, mismatches) = self.getTokensMismatches(metadatas=metadatas)
+            if tokensAmount > len(metadatas):
+                return False
+            missing = metadatas[tokensAmount:]
+            if len(mismatches) == 0 and len(missing) == 0:
+                return True
+
+            fixes   = []
+            appends = []
+            with telemetry.stage("pack", items=len(mismatches) + len(missing)):
+                for (functionName, functionParams, batch) in self._packTokenFixCalls(indices=mismatches, metadatas=[metadatas[i] for i in mismatches], margin=margin, maxItems=maxItems, maxBytes=maxBytes, sender=msig.ADDRESS):
+                    submit = lambda pipeline, functionName=functionName, functionParams=functionParams: self._callFromMultisigAsync(pipeline=pipeline, msig=msig, functionName=functionName, functionParams=functionParams, value=EVER, flags=1)
+                    fixes.append((functionName, len(batch), submit, sum(len(metadata.encode("utf-8")) for metadata in batch)))
+                start = tokensAmount
+                for batch in self.packTokens(metadatas=missing, margin=margin, start=start, maxItems=maxItems, maxBytes=maxBytes, sender=msig.ADDRESS):
+                    (functionName, functionParams) = self._addTokensCall(metadatas=batch, start=start)
+                    submit = lambda pipeline, functionName=functionName, functionParams=functionParams: self._callFromMultisigAsync(pipeline=pipeline, msig=msig, functionName=functionName, functionParams=functionParams, value=EVER, flags=1)
+                    appends.append((functionName, len(batch), submit, sum(len(metadata.encode("utf-8")) for metadata in batch)))
+                    start += len(batch)
+
+            # Plain addTokens appends wherever it lands, so those batches can't overtake each other
+            ordered = self._addTokensCall(metadatas=[], start=tokensAmount)[0] == "addTokensAt"
+            if onBatch is not None:
+                for (functionName, count, _, _) in (fixes + appends if ordered else fixes):
+                    onBatch(functionName, count)
+            if ordered:
+                results       = self._submitCalls([(submit, size) for (_, _, submit, size) in fixes + appends], window=window, telemetry=telemetry)
+                appendResults = results[len(fixes):]
+            else:
+                self._submitCalls([(submit, size) for (_, _, submit, size) in fixes], window=window, telemetry=telemetry)
+                appendResults = []
+                for (functionName, count, submit, size) in appends:
+                    if onBatch is not None:
+                        onBatch(functionName, count)
+                    appendResults += self._submitCalls([(submit, size)], window=1, telemetry=telemetry)
+                    if appendResults[-1]["exception"]["errorCode"] != 0:
+                        break
+
+            # Multisig transactions are done, wait for Distributor to process their internal messages;
+            # only batches up to the first failed one can land
+            settled = tokensAmount
+            for (_, count, _, _), result in zip(appends, appendResults):
+                if result["exception"]["errorCode"] != 0:
+                    break
+                settled += count
+            with telemetry.stage("settle"):
+                self._waitTokensAmount(expected=settled, timeout=settleTimeout)
+
+        return False
+
+    def _waitTokensAmount(self, expected: int, timeout: int):
+        deadline = getNowTimestamp() + timeout
+        while getNowTimestamp() < deadline:
+            if self.getTokensAmount() >= expected:
+                return True
+            time.sleep(1)
+        return False
+
     def lockTokens(self, msig: Multisig):
         result = self._callFromMultisig(msig=msig, functionName="lockTokens", functionParams={}, value=DIME, flags=1)
         return result
@@ -91,5 +361,53 @@ class Distributor(BaseContract):
         result = self._run(functionName="getInfo", functionParams={"includeTokens":includeTokens, "includeWhitelist":includeWhitelist})
         return result
 
+    # Legacy Distributors report the amount only together with the whole token list
+    def getTokensAmount(self):
+        result = self.getInfo(includeTokens=self.isLegacy())
+        return int(str(result["tokensAmount"]), 0)
+
+    def getTokens(self, start: int, count: int):
+        result = self._run(functionName="getTokens", functionParams={"start":start, "count":count})
+        return result
+
+    def getTokensDigests(self, start: int, count: int, chunkSize: int):
+        result = self._run(functionName="getTokensDigests", functionParams={"start":start, "count":count, "chunkSize":chunkSize})
+        return result
+
+    # Compares on-chain tokens with "metadatas" by chunk digests and downloads only the chunks that differ
+    # (legacy Distributors are compared on the whole list from getInfo).
+    # Returns (tokensAmount, list of mismatched indexes); indexes past tokensAmount are not included.
+    def getTokensMismatches(self, metadatas: List[str], chunkSize: int = DIGEST_CHUNK_SIZE, pageSize: int = DIGEST_PAGE_SIZE):
+        if self.isLegacy():
+            tokens = self.getInfo(includeTokens=True)["tokens"]
+            return (len(tokens), [i for i, token in enumerate(tokens[:len(metadatas)]) if token != metadatas[i]])
+
+        tokensAmount = self.getTokensAmount()
+        count        = min(tokensAmount, len(metadatas))
+        local        = calculateTokensDigests(metadatas[:count], chunkSize)
+        mismatches   = []
+
+        pageStart = 0
+        while pageStart < count:
+            pageCount = min(pageSize, count - pageStart)
+            try:
+                remote = self.getTokensDigests(start=pageStart, count=pageCount, chunkSize=chunkSize)["digests"]
+            except TonException as ever:
+                if getValuesFromException(ever)["errorCode"] not in ERROR_OUT_OF_GAS or pageSize <= chunkSize:
+                    raise
+                pageSize = max(pageSize // 2 // chunkSize, 1) * chunkSize
+                continue
+
+            pageStart += pageCount
+            for n, digest in enumerate(remote):
+                chunkStart = pageStart - pageCount + n * chunkSize
+                if int(str(digest), 0) == local[chunkStart // chunkSize]:
+                    continue
+
+                tokens = self.getTokens(start=chunkStart, count=min(chunkSize, count - chunkStart))["tokens"]
+                mismatches.extend([chunkStart + i for i, token in enumerate(tokens) if token != metadatas[chunkStart + i]])
+
+        return (tokensAmount, mismatches)
+
 # ==============================================================================
 # 
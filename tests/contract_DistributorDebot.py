@@ -7,10 +7,10 @@ from   freeton_utils import *
 
 class DistributorDebot(BaseContract):
     
-    def __init__(self, tonClient: TonClient, ownerAddress: str, distributorAddress: str, signer: Signer = None):
+    def __init__(self, everClient: TonClient, ownerAddress: str, distributorAddress: str, signer: Signer = None):
         genSigner = generateSigner() if signer is None else signer
         self.CONSTRUCTOR = {"ownerAddress":ownerAddress, "distributorAddress":distributorAddress}
-        BaseContract.__init__(self, tonClient=tonClient, contractName="DistributorDebot", pubkey=genSigner.keys.public, signer=genSigner)
+        BaseContract.__init__(self, everClient=everClient, contractName="DistributorDebot", pubkey=genSigner.keys.public, signer=genSigner)
 
     # ========================================
     #
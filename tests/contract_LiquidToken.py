@@ -10,7 +10,7 @@ class LiquidToken(BaseContract):
     def __init__(self, everClient: TonClient, collectionAddress: str, tokenID: int, editionNumber: int, signer: Signer = None):
         genSigner = generateSigner() if signer is None else signer
         self.CONSTRUCTOR = {}
-        self.INITDATA    = {"_collectionAddress":collectionAddress, "_tokenID":tokenID, "_editionNumber":editionNumber}
+        self.INITDATA    = {"_collectionAddress":collectionAddress, "_tokenID":tokenID, "_printID":editionNumber}
         BaseContract.__init__(self, everClient=everClient, contractName="LiquidToken", pubkey=ZERO_PUBKEY, signer=genSigner)
 
     #========================================
@@ -49,5 +49,21 @@ class LiquidToken(BaseContract):
         result = self._run(functionName="getInfo", functionParams={"includeMetadata":includeMetadata, "answerId":0})
         return result
 
+# ==============================================================================
+# Offline bulk address calculation, "tokens" is a list of (tokenID, editionNumber)
+def calculateTokenAddresses(collectionAddress: str, tokens, workers: int = None):
+    initialDataArray = [{"_collectionAddress":collectionAddress, "_tokenID":tokenID, "_printID":editionNumber} for (tokenID, editionNumber) in tokens]
+    return calculateAddresses(abiPath="../bin/LiquidToken.abi.json", tvcPath="../bin/LiquidToken.tvc", initialDataArray=initialDataArray, initialPubkey=ZERO_PUBKEY, workers=workers)
+
+# ==============================================================================
+# Bulk getters for many tokens, results are yielded in the order of "tokenAddresses"
+def getTokensBasicInfo(everClient: TonClient, tokenAddresses: List[str], includeMetadata: bool = True, workers: int = None):
+    calls = [("../bin/LiquidToken.abi.json", address, "getBasicInfo", {"includeMetadata":includeMetadata, "answerId":0}) for address in tokenAddresses]
+    return runFunctionsBatch(everClient=everClient, calls=calls, workers=workers)
+
+def getTokensInfo(everClient: TonClient, tokenAddresses: List[str], includeMetadata: bool = True, workers: int = None):
+    calls = [("../bin/LiquidToken.abi.json", address, "getInfo", {"includeMetadata":includeMetadata, "answerId":0}) for address in tokenAddresses]
+    return runFunctionsBatch(everClient=everClient, calls=calls, workers=workers)
+
 # ==============================================================================
 # 
@@ -0,0 +1,416 @@
+#!/usr/bin/env python3
+
+# ==============================================================================
+# Local in-process blockchain backend.
+# Account BOCs are kept in memory, messages are executed with `tvm.run_executor`
+# and outbound internal messages are followed until the queue is empty.
+# SandboxClient looks like TonClient for everything freeton_utils uses (offline
+# modules are shared, `net` and `processing` are local), so wrappers, tests and
+# CLI commands run against it unchanged:
+#
+#     freeton_utils.BACKEND = SandboxClient()
+#
+import os
+import json
+import hashlib
+import threading
+import freeton_utils
+from   collections   import OrderedDict
+from   freeton_utils import *
+
+# ==============================================================================
+#
+SANDBOX_MAX_TRANSACTIONS = 1000
+SANDBOX_MAX_RESULTS      = 1000  # Results kept for wait_for_transaction, sends without a wait (callFunction
+                                 # with waitForTransaction=False) never collect theirs, the oldest are dropped
+SANDBOX_GIVER_ABI        = "../bin/local_giver.abi.json"
+SANDBOX_GIVER_ADDRESS    = "0:841288ed3b55d9cdafa806807f02a0ae0c169aa5edfe88a789a6482429756a94"
+
+# ==============================================================================
+# GRAPHQL SUBSET
+# Projections are parsed into [(name, arguments, subfields)], `format:DEC` turns
+# "0x..." values into decimal strings; filters support eq/ne/in/notIn/gt/lt/ge/le
+# and nested objects.
+def _parseFields(fields: str):
+    tokens = []
+    i      = 0
+    while i < len(fields):
+        char = fields[i]
+        if char in "{},":
+            tokens.append(char)
+            i += 1
+        elif char == "(":
+            end = fields.index(")", i)
+            tokens.append(fields[i:end + 1])
+            i = end + 1
+        elif char.isspace():
+            i += 1
+        else:
+            start = i
+            while i < len(fields) and (fields[i].isalnum() or fields[i] == "_"):
+                i += 1
+            if start == i:
+                raise ValueError(f"Unexpected character in projection: {char}")
+            tokens.append(fields[start:i])
+
+    def _parseLevel(pos):
+        result = []
+        while pos < len(tokens) and tokens[pos] != "}":
+            if tokens[pos] == ",":
+                pos += 1
+                continue
+            name      = tokens[pos]
+            arguments = ""
+            subfields = None
+            pos      += 1
+            if pos < len(tokens) and tokens[pos].startswith("("):
+                arguments = tokens[pos]
+                pos      += 1
+            if pos < len(tokens) and tokens[pos] == "{":
+                (subfields, pos) = _parseLevel(pos + 1)
+                pos += 1
+            result.append((name, arguments, subfields))
+        return (result, pos)
+
+    return _parseLevel(0)[0]
+
+def _formatValue(value, arguments: str):
+    if "DEC" in arguments.replace(" ", ""):
+        if isinstance(value, str) and value.startswith(("0x", "-0x")):
+            return str(int(value, 16))
+        if isinstance(value, int) and not isinstance(value, bool):
+            return str(value)
+    return value
+
+def _project(document, fieldsTree):
+    if isinstance(document, list):
+        return [_project(item, fieldsTree) for item in document]
+    if not isinstance(document, dict):
+        return document
+
+    result = {}
+    for (name, arguments, subfields) in fieldsTree:
+        value = document.get(name)
+        if subfields is not None and value is not None:
+            value = _project(value, subfields)
+        result[name] = _formatValue(value, arguments)
+    return result
+
+def _comparable(value):
+    if isinstance(value, str) and value.startswith(("0x", "-0x")):
+        return int(value, 16)
+    return value
+
+_FILTER_OPERATORS = {
+    "eq":    lambda a, b: a == b,
+    "ne":    lambda a, b: a != b,
+    "gt":    lambda a, b: a is not None and a >  b,
+    "lt":    lambda a, b: a is not None and a <  b,
+    "ge":    lambda a, b: a is not None and a >= b,
+    "le":    lambda a, b: a is not None and a <= b,
+    "in":    lambda a, b: a in b,
+    "notIn": lambda a, b: a not in b,
+}
+
+def _matches(document, filter):
+    if not filter:
+        return True
+
+    for field, condition in filter.items():
+        value = document.get(field) if isinstance(document, dict) else None
+        if any([key in _FILTER_OPERATORS for key in condition]):
+            for operator, expected in condition.items():
+                if isinstance(expected, list):
+                    expected = [_comparable(item) for item in expected]
+                else:
+                    expected = _comparable(expected)
+                if not _FILTER_OPERATORS[operator](_comparable(value), expected):
+                    return False
+        elif not _matches(value if value is not None else {}, condition):
+            return False
+    return True
+
+# ==============================================================================
+#
+def _sandboxException(code: int, message: str, data = None):
+    return TonException(error=ClientError(code=code, message=message, data=data if data is not None else {}))
+
+def _emptyFees():
+    return TransactionFees(in_msg_fwd_fee=0, storage_fee=0, gas_fee=0, out_msgs_fwd_fee=0, total_account_fees=0, total_output=0, ext_in_msg_fee=0, total_fwd_fees=0, account_fees=0)
+
+# ==============================================================================
+#
+class SandboxNet(object):
+    def __init__(self, sandbox):
+        self.SANDBOX = sandbox
+
+    def query_collection(self, params: ParamsOfQueryCollection) -> ResultOfQueryCollection:
+        with self.SANDBOX.LOCK:
+            documents = list(self.SANDBOX.COLLECTIONS[params.collection].values())
+
+        documents = [document for document in documents if _matches(document, params.filter)]
+        for order in reversed(params.order or []):
+            documents.sort(key=lambda document: (document.get(order.path) is None, _comparable(document.get(order.path))), reverse=(order.direction == SortDirection.DESC))
+        if params.limit is not None:
+            documents = documents[:params.limit]
+
+        fieldsTree = _parseFields(params.result)
+        return ResultOfQueryCollection(result=[_project(document, fieldsTree) for document in documents])
+
+    def query_transaction_tree(self, params: ParamsOfQueryTransactionTree) -> ResultOfQueryTransactionTree:
+        messages     = []
+        transactions = []
+        queue        = [params.in_msg]
+        maxCount     = params.transaction_max_count if params.transaction_max_count is not None else 50
+
+        with self.SANDBOX.LOCK:
+            while len(queue) > 0:
+                messageID = queue.pop(0)
+                message   = self.SANDBOX.COLLECTIONS["messages"].get(messageID)
+                if message is None:
+                    continue
+
+                decoded = self.SANDBOX._decodeBody(message, params.abi_registry or [])
+                messages.append(MessageNode(id                 = message["id"],
+                                            bounce             = message.get("bounce") or False,
+                                            src_transaction_id = message.get("src_transaction_id"),
+                                            dst_transaction_id = message.get("dst_transaction_id"),
+                                            src                = message.get("src"),
+                                            dst                = message.get("dst"),
+                                            value              = _formatValue(message.get("value"), "format:DEC"),
+                                            decoded_body       = decoded))
+
+                transaction = self.SANDBOX.COLLECTIONS["transactions"].get(message.get("dst_transaction_id"))
+                if transaction is None or (maxCount != 0 and len(transactions) >= maxCount):
+                    continue
+
+                transactions.append(TransactionNode(id           = transaction["id"],
+                                                    in_msg       = transaction["in_msg"],
+                                                    out_msgs     = transaction.get("out_msgs", []),
+                                                    account_addr = transaction.get("account_addr"),
+                                                    total_fees   = _formatValue(transaction.get("total_fees"), "format:DEC"),
+                                                    aborted      = transaction.get("aborted", False),
+                                                    exit_code    = (transaction.get("compute") or {}).get("exit_code")))
+                queue += transaction.get("out_msgs", [])
+
+        return ResultOfQueryTransactionTree(messages=messages, transactions=transactions)
+
+# ==============================================================================
+#
+class SandboxProcessing(object):
+    def __init__(self, sandbox):
+        self.SANDBOX = sandbox
+
+    def send_message(self, params: ParamsOfSendMessage) -> ResultOfSendMessage:
+        self.SANDBOX.processExternalMessage(params.message)
+        return ResultOfSendMessage(shard_block_id="sandbox", sending_endpoints=[])
+
+    def wait_for_transaction(self, params: ParamsOfWaitForTransaction) -> ResultOfProcessMessage:
+        messageID = self.SANDBOX._getMessageID(params.message)
+        with self.SANDBOX.LOCK:
+            result = self.SANDBOX.RESULTS.pop(messageID, None)
+
+        if result is None:
+            raise _sandboxException(ProcessingErrorCode.TRANSACTION_WAIT_TIMEOUT, "Message was not sent to the sandbox", {"message_id": messageID})
+        if isinstance(result, TonException):
+            raise result
+        return result
+
+    def process_message(self, params: ParamsOfProcessMessage) -> ResultOfProcessMessage:
+        encoded = self.SANDBOX.abi.encode_message(params=params.message_encode_params)
+        self.send_message(params=ParamsOfSendMessage(message=encoded.message))
+        return self.wait_for_transaction(params=ParamsOfWaitForTransaction(message=encoded.message, shard_block_id="sandbox"))
+
+# ==============================================================================
+#
+class SandboxClient(object):
+    def __init__(self, stateFile: str = None):
+        offline          = getOfflineClient()
+        self.abi         = offline.abi
+        self.boc         = offline.boc
+        self.crypto      = offline.crypto
+        self.utils       = offline.utils
+        self.tvm         = offline.tvm
+        self.net         = SandboxNet(self)
+        self.processing  = SandboxProcessing(self)
+        self.LOCK        = threading.RLock()
+        self.COLLECTIONS = {"accounts": {}, "messages": {}, "transactions": {}}
+        self.RESULTS     = OrderedDict()
+        self.STATEFILE   = stateFile
+
+        if stateFile is not None and os.path.exists(stateFile):
+            self.load(stateFile)
+
+    def destroy_context(self):
+        pass
+
+    # ========================================
+    # STATE
+    def save(self, stateFile: str = None):
+        with self.LOCK:
+            state = {"accounts": {address: account["boc"] for address, account in self.COLLECTIONS["accounts"].items()},
+                     "messages": self.COLLECTIONS["messages"], "transactions": self.COLLECTIONS["transactions"]}
+        with open(stateFile or self.STATEFILE, "w") as fp:
+            json.dump(state, fp)
+
+    def load(self, stateFile: str):
+        with open(stateFile) as fp:
+            state = json.load(fp)
+        with self.LOCK:
+            self.COLLECTIONS["messages"]     = state.get("messages",     {})
+            self.COLLECTIONS["transactions"] = state.get("transactions", {})
+            self.COLLECTIONS["accounts"]     = {}
+            for address, boc in state.get("accounts", {}).items():
+                self._storeAccount(address, boc)
+
+    # ========================================
+    #
+    def topUp(self, address: str, amount: int):
+        params  = ParamsOfEncodeInternalMessage(value=str(amount), address=address, src_address=SANDBOX_GIVER_ADDRESS, bounce=False)
+        message = self.abi.encode_internal_message(params=params).message
+        with self.LOCK:
+            self._processQueue([message])
+
+    def processExternalMessage(self, message: str):
+        messageID = self._getMessageID(message)
+        try:
+            result = self._executeExternal(message)
+        except TonException as ever:
+            result = ever
+
+        with self.LOCK:
+            self.RESULTS[messageID] = result
+            while len(self.RESULTS) > SANDBOX_MAX_RESULTS:
+                self.RESULTS.popitem(last=False)
+
+    # ========================================
+    #
+    def _getMessageID(self, message: str):
+        return self.boc.get_boc_hash(params=ParamsOfGetBocHash(boc=message)).hash
+
+    def _parseMessage(self, message: str):
+        parsed = self.boc.parse_message(params=ParamsOfParse(boc=message)).parsed
+        parsed["boc"] = message
+        return parsed
+
+    def _storeAccount(self, address: str, boc: str):
+        if boc is None or boc == "":
+            self.COLLECTIONS["accounts"].pop(address, None)
+            return
+        parsed        = self.boc.parse_account(params=ParamsOfParse(boc=boc)).parsed
+        parsed["boc"] = boc
+        self.COLLECTIONS["accounts"][address] = parsed
+
+    def _storeTransaction(self, message, transaction):
+        transaction = dict(transaction)
+        transaction.setdefault("in_msg", message["id"])
+        transaction.pop("boc", None)
+        self.COLLECTIONS["transactions"][transaction["id"]] = transaction
+
+        message["dst_transaction_id"] = transaction["id"]
+        message["dst_transaction"]    = {"id": transaction["id"]}
+        self.COLLECTIONS["messages"][message["id"]] = message
+        return transaction
+
+    def _storeOutMessages(self, transaction, outMessages):
+        parsedMessages = []
+        for outMessage in outMessages:
+            parsed                       = self._parseMessage(outMessage)
+            parsed["src_transaction_id"] = transaction["id"]
+            parsed["src_transaction"]    = {"id": transaction["id"]}
+            self.COLLECTIONS["messages"][parsed["id"]] = parsed
+            parsedMessages.append(parsed)
+        return parsedMessages
+
+    def _run(self, message, account, skipCheck: bool):
+        params = ParamsOfRunExecutor(message=message["boc"], account=account, skip_transaction_check=skipCheck, return_updated_account=True)
+        return self.tvm.run_executor(params=params)
+
+    def _executeExternal(self, messageBoc: str):
+        with self.LOCK:
+            message = self._parseMessage(messageBoc)
+            address = message["dst"]
+            account = self.COLLECTIONS["accounts"].get(address)
+
+            if account is None and address == SANDBOX_GIVER_ADDRESS:
+                return self._executeGiver(message)
+            if account is None:
+                raise _sandboxException(ProcessingErrorCode.MESSAGE_REJECTED, "Account does not exist", {"account_address": address})
+
+            result      = self._run(message, AccountForExecutor.Account(boc=account["boc"]), skipCheck=False)
+            self._storeAccount(address, result.account)
+            transaction = self._storeTransaction(message, result.transaction)
+            outMessages = self._storeOutMessages(transaction, result.out_messages)
+            self._processQueue([msg["boc"] for msg in outMessages if msg.get("msg_type") == 0], alreadyParsed=outMessages)
+
+            return ResultOfProcessMessage(transaction=result.transaction, out_messages=result.out_messages, fees=result.fees, decoded=result.decoded)
+
+    def _executeGiver(self, message):
+        (_, decoded) = decodeMessageBody(message["body"], [SANDBOX_GIVER_ABI])
+        if decoded == "" or decoded.name != "sendGrams":
+            raise _sandboxException(ProcessingErrorCode.MESSAGE_REJECTED, "Sandbox giver only supports sendGrams", {"account_address": SANDBOX_GIVER_ADDRESS})
+
+        params      = ParamsOfEncodeInternalMessage(value=str(int(str(decoded.value["amount"]), 0)), address=decoded.value["dest"], src_address=SANDBOX_GIVER_ADDRESS, bounce=False)
+        outMessage  = self.abi.encode_internal_message(params=params).message
+        transaction = {"id":           hashlib.sha256(("giver" + message["id"]).encode()).hexdigest(),
+                       "account_addr": SANDBOX_GIVER_ADDRESS,
+                       "in_msg":       message["id"],
+                       "out_msgs":     [self._getMessageID(outMessage)],
+                       "outmsg_cnt":   1,
+                       "aborted":      False,
+                       "status":       3,
+                       "status_name":  "Finalized",
+                       "end_status":   1,
+                       "total_fees":   "0x0",
+                       "compute":      {"exit_code": 0, "exit_arg": None, "skipped_reason": None, "skipped_reason_name": None, "gas_fees": "0x0"},
+                       "storage":      {"storage_fees_collected": "0x0"}}
+
+        transaction = self._storeTransaction(message, transaction)
+        outMessages = self._storeOutMessages(transaction, [outMessage])
+        self._processQueue([outMessage], alreadyParsed=outMessages)
+        return ResultOfProcessMessage(transaction=transaction, out_messages=[outMessage], fees=_emptyFees())
+
+    # Internal messages are executed in FIFO order, which keeps per-pair delivery order
+    def _processQueue(self, messages, alreadyParsed = None):
+        parsedByBoc = {message["boc"]: message for message in (alreadyParsed or [])}
+        queue       = [parsedByBoc.get(message) or self._parseMessage(message) for message in messages]
+        count       = 0
+
+        while len(queue) > 0:
+            count += 1
+            if count > SANDBOX_MAX_TRANSACTIONS:
+                raise _sandboxException(ProcessingErrorCode.INVALID_DATA, "Too many transactions in one sandbox cascade", {"limit": SANDBOX_MAX_TRANSACTIONS})
+
+            message = queue.pop(0)
+            self.COLLECTIONS["messages"].setdefault(message["id"], message)
+            if message.get("msg_type") != 0:
+                continue
+
+            address = message["dst"]
+            account = self.COLLECTIONS["accounts"].get(address)
+            target  = AccountForExecutor.Account(boc=account["boc"]) if account is not None else AccountForExecutor.NoAccount()
+
+            try:
+                result = self._run(message, target, skipCheck=True)
+            except TonException:
+                continue
+
+            self._storeAccount(address, result.account)
+            transaction = self._storeTransaction(message, result.transaction)
+            queue      += [msg for msg in self._storeOutMessages(transaction, result.out_messages) if msg.get("msg_type") == 0]
+
+    def _decodeBody(self, message, abiRegistry):
+        if message.get("body") is None:
+            return None
+
+        isInternal = (message.get("msg_type") == 0)
+        for abi in abiRegistry:
+            try:
+                params = ParamsOfDecodeMessageBody(abi=abi, body=message["body"], is_internal=isInternal)
+                return self.abi.decode_message_body(params=params)
+            except TonException:
+                pass
+        return None
+
+# ==============================================================================
+#
@@ -3,11 +3,20 @@
 # ==============================================================================
 # 
 import base64
+import json
+import hashlib
 import time
 import ast
 import os
+import atexit
+import asyncio
+import threading
+import multiprocessing
+import contextlib
+from   concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
 from   tonclient.client import *
 from   tonclient.types  import *
+from   collections import OrderedDict
 from   datetime import datetime
 from   pprint import pprint
 
@@ -20,6 +29,11 @@ DIME          =  100000000
 MSIG_GIVER    = ""
 USE_GIVER     = True
 THROW         = True
+MAX_MSG_CELLS = 1 << 13  # ConfigParam 43 size limits of a message
+MAX_MSG_BITS  = 1 << 21
+METADATA_COMPACT    = False  # Canonical metadata: sorted keys, minimal separators, UTF-8 as is
+METADATA_OMIT_EMPTY = False  # Also drop "", null, [] and {} fields from compact metadata
+BACKEND       = None   # Client used instead of networked ones, e.g. freeton_sandbox.SandboxClient
 
 # ==============================================================================
 # 
@@ -27,10 +41,62 @@ def getApiEndpoints(testnet: bool):
     return ["https://net1.ton.dev", "https://net5.ton.dev"] if testnet else ["https://main2.ton.dev", "https://main3.ton.dev", "https://main4.ton.dev"]
 
 def getEverClient(testnet: bool, customServer: str = None):
+    if BACKEND is not None:
+        return BACKEND
+
     if customServer is not None:
-        return TonClient(config=ClientConfig(network=NetworkConfig(server_address=customServer)))
+        return getPooledClient(serverAddress=customServer)
     
-    return TonClient(config=ClientConfig(network=NetworkConfig(endpoints=getApiEndpoints(testnet))))
+    return getPooledClient(endpoints=getApiEndpoints(testnet))
+
+# ==============================================================================
+# CLIENT POOL
+# One offline client serves all crypto/ABI/BOC work, networked clients are shared
+# per endpoint set. Clients are bound to the process that created them, forked
+# workers get their own.
+_OFFLINE_CLIENT = None
+_CLIENT_POOL    = {}
+_CLIENT_LOCK    = threading.Lock()
+
+def getOfflineClient() -> TonClient:
+    global _OFFLINE_CLIENT
+
+    with _CLIENT_LOCK:
+        if _OFFLINE_CLIENT is None or _OFFLINE_CLIENT[0] != os.getpid():
+            # ClientConfig() defaults to http://localhost, an empty NetworkConfig has no endpoints at all;
+            # otherwise run_executor/run_tvm keep trying to fetch the blockchain config from the network
+            _OFFLINE_CLIENT = (os.getpid(), TonClient(config=ClientConfig(network=NetworkConfig())))
+        return _OFFLINE_CLIENT[1]
+
+def getPooledClient(serverAddress: str = None, endpoints: List[str] = None) -> TonClient:
+    key = ("server", serverAddress) if serverAddress is not None else ("endpoints", tuple(endpoints))
+
+    with _CLIENT_LOCK:
+        pooled = _CLIENT_POOL.get(key)
+        if pooled is None or pooled[0] != os.getpid():
+            if serverAddress is not None:
+                network = NetworkConfig(server_address=serverAddress)
+            else:
+                network = NetworkConfig(endpoints=list(endpoints))
+            pooled = (os.getpid(), TonClient(config=ClientConfig(network=network)))
+            _CLIENT_POOL[key] = pooled
+        return pooled[1]
+
+def closeClients():
+    global _OFFLINE_CLIENT
+
+    with _CLIENT_LOCK:
+        clients = list(_CLIENT_POOL.values())
+        if _OFFLINE_CLIENT is not None:
+            clients.append(_OFFLINE_CLIENT)
+        _CLIENT_POOL.clear()
+        _OFFLINE_CLIENT = None
+
+    for (pid, everClient) in clients:
+        if pid == os.getpid():
+            everClient.destroy_context()
+
+atexit.register(closeClients)
 
 # ==============================================================================
 # EXIT CODE FOR SINGLE-MESSAGE OPERATIONS
@@ -50,25 +116,59 @@ def _unwrapMessagesAndPrint(result):
     pprint(msgs)
 
 def _getExitCode(msgIdArray, everClient: TonClient):
-    msgArray     = unwrapMessages(everClient, msgIdArray, _getAbiArray())
+    msgArray     = unwrapMessages(everClient, msgIdArray, _getAbiArray(), maxDepth=0)
     if msgArray != "":
         realExitCode = msgArray[0]["TX_DETAILS"]["compute"]["exit_code"]
     else:
         realExitCode = -1
     return realExitCode   
 
+# ==============================================================================
+# ARTIFACT CACHE
+# "../bin" artifacts are parsed once per process and reused until the file on disk
+# changes; entries are keyed by (kind, absolute path) and validated by mtime/size.
+_ARTIFACT_CACHE      = {}
+_ARTIFACT_CACHE_LOCK = threading.Lock()
+
+def _getCachedArtifact(kind: str, path: str, loader):
+    fullPath = os.path.abspath(path)
+    stat     = os.stat(fullPath)
+    stamp    = (stat.st_mtime_ns, stat.st_size)
+    key      = (kind, fullPath)
+
+    with _ARTIFACT_CACHE_LOCK:
+        cached = _ARTIFACT_CACHE.get(key)
+    if cached is not None and cached[0] == stamp:
+        return cached[1]
+
+    value = loader(fullPath)
+    with _ARTIFACT_CACHE_LOCK:
+        _ARTIFACT_CACHE[key] = (stamp, value)
+    return value
+
+def clearArtifactCache():
+    with _ARTIFACT_CACHE_LOCK:
+        _ARTIFACT_CACHE.clear()
+
 # ==============================================================================
 # 
-def getAbi(abiPath):
-    abi = Abi.from_path(path=abiPath)
-    return abi
+def _loadAbi(abiPath):
+    return Abi.from_path(path=abiPath)
 
-def getTvc(tvcPath):
+def _loadTvc(tvcPath):
     fp  = open(tvcPath, 'rb')
     tvc = base64.b64encode(fp.read()).decode()
     fp.close()
     return tvc
 
+def getAbi(abiPath):
+    abi = _getCachedArtifact("abi", abiPath, _loadAbi)
+    return abi
+
+def getTvc(tvcPath):
+    tvc = _getCachedArtifact("tvc", tvcPath, _loadTvc)
+    return tvc
+
 def getAbiTvc(abiPath, tvcPath):
     return (getAbi(abiPath), getTvc(tvcPath))
 
@@ -80,6 +180,105 @@ def stringToHex(inputString):
 def hexToString(inputHex):
     return bytearray.fromhex(inputHex).decode()
 
+# ==============================================================================
+# METADATA
+# Every metadata string that goes on-chain is produced here, so equality checks don't
+# depend on key order and the encoding mode is the same for all commands.
+def _omitEmptyFields(value):
+    if isinstance(value, dict):
+        result = {key: _omitEmptyFields(item) for key, item in value.items()}
+        return {key: item for key, item in result.items() if item not in ("", None, [], {})}
+    if isinstance(value, list):
+        return [_omitEmptyFields(item) for item in value]
+    return value
+
+def dumpMetadata(meta, compact: bool = None, omitEmpty: bool = None) -> str:
+    compact   = METADATA_COMPACT    if compact   is None else compact
+    omitEmpty = METADATA_OMIT_EMPTY if omitEmpty is None else omitEmpty
+    if not compact:
+        return json.dumps(meta)
+    if omitEmpty:
+        meta = _omitEmptyFields(meta)
+    return json.dumps(meta, sort_keys=True, separators=(",", ":"), ensure_ascii=False)
+
+# Rough fees of keeping strings in contract storage and sending them in messages, with
+# workchain 0 prices from ConfigParam 18/25; takes UTF-8 sizes of strings, which are
+# chained in cells of 127 bytes.
+FWD_BIT_PRICE          = 1000    # nanoevers
+FWD_CELL_PRICE         = 100000  # nanoevers
+STORAGE_BIT_PRICE_PS   = 1       # nanoevers per 2^16 seconds
+STORAGE_CELL_PRICE_PS  = 500     # nanoevers per 2^16 seconds
+
+def estimateStringsFees(sizes):
+    size  = sum(sizes)
+    cells = sum(max(1, -(-length // 127)) for length in sizes)
+    year  = 365 * 24 * 3600
+    return {"bytes":      size,
+            "cells":      cells,
+            "fwdFee":     size * 8 * FWD_BIT_PRICE + cells * FWD_CELL_PRICE,
+            "storageFee": (size * 8 * STORAGE_BIT_PRICE_PS + cells * STORAGE_CELL_PRICE_PS) * year // 65536}
+
+# ==============================================================================
+# BOC PARSING
+# Minimal offline reader of serialized BOCs, returns cells as (data, bitLength,
+# refs) and root indexes; enough to peek at body prefixes and measure sizes.
+def parseBoc(boc: str):
+    raw = base64.b64decode(boc)
+    if raw[:4] != bytes.fromhex("b5ee9c72"):
+        raise ValueError("Unsupported BOC format")
+
+    hasIdx   = raw[4] & 0x80
+    size     = raw[4] & 0x07
+    offBytes = raw[5]
+    pos      = 6
+
+    def _read(length):
+        nonlocal pos
+        value = int.from_bytes(raw[pos:pos + length], "big")
+        pos  += length
+        return value
+
+    cellsNum = _read(size)
+    rootsNum = _read(size)
+    _read(size)      # absent
+    _read(offBytes)  # total cells size
+    roots    = [_read(size) for _ in range(rootsNum)]
+    if hasIdx:
+        pos += cellsNum * offBytes
+
+    cells = []
+    for _ in range(cellsNum):
+        d1 = _read(1)
+        d2 = _read(1)
+        if d1 & 0x10:
+            pos += (bin(d1 >> 5).count("1") + 1) * (32 + 2)
+
+        dataLength = (d2 + 1) // 2
+        data       = raw[pos:pos + dataLength]
+        pos       += dataLength
+        bits       = dataLength * 8
+        if d2 & 1 and dataLength > 0:
+            last  = data[-1]
+            bits -= ((last & -last).bit_length())
+
+        refs = [_read(size) for _ in range(d1 & 0x07)]
+        cells.append((data, bits, refs))
+
+    if len(cells) != cellsNum or pos > len(raw):
+        raise ValueError("Truncated BOC")
+    return (cells, roots)
+
+def _readBits(data: bytes, bits: int, offset: int, count: int):
+    if offset + count > bits:
+        return None
+    value = int.from_bytes(data, "big") >> (len(data) * 8 - offset - count)
+    return value & ((1 << count) - 1)
+
+# Unique cells and data bits of a BOC, the units that network message limits are expressed in.
+def getBocStats(boc: str):
+    (cells, roots) = parseBoc(boc)
+    return {"cells": len(cells), "bits": sum(cell[1] for cell in cells)}
+
 # ==============================================================================
 #
 def getNowTimestamp():
@@ -126,14 +325,18 @@ def getValuesFromException(everException: TonException):
 
 # ==============================================================================
 #
-def getCodeFromTvc(tvcPath):
+def _loadCodeFromTvc(tvcPath):
 
-    everClient     = TonClient(config=ClientConfig())
+    everClient    = getOfflineClient()
     tvc           = getTvc(tvcPath)
     tvcCodeParams = ParamsOfGetCodeFromTvc(tvc=tvc)
     tvcCodeResult = everClient.boc.get_code_from_tvc(params=tvcCodeParams).code
     return tvcCodeResult
 
+def getCodeFromTvc(tvcPath):
+    code = _getCachedArtifact("code", tvcPath, _loadCodeFromTvc)
+    return code
+
 # ==============================================================================
 #
 def loadSigner(keysFile):
@@ -144,22 +347,62 @@ def loadSigner(keysFile):
     return signer
 
 def generateSigner():
-    keypair = TonClient(config=ClientConfig()).crypto.generate_random_sign_keys()
+    keypair = getOfflineClient().crypto.generate_random_sign_keys()
     signer  = Signer.Keys(keys=keypair)
     return signer
 
+# ==============================================================================
+# ADDRESS CALCULATION
+# Address is the hash of StateInit built from TVC code and TVC data with static
+# variables applied, the same way `tvm.buildStateInit` does it in contracts.
+def _loadStateInitFromTvc(tvcPath):
+
+    everClient = getOfflineClient()
+    params     = ParamsOfDecodeStateInit(state_init=getTvc(tvcPath))
+    result     = everClient.boc.decode_state_init(params=params)
+    return result
+
+def getStateInitFromTvc(tvcPath):
+    stateInit = _getCachedArtifact("stateInit", tvcPath, _loadStateInitFromTvc)
+    return stateInit
+
+def calculateAddress(abiPath, tvcPath, initialPubkey, initialData, workchainID: int = 0):
+
+    everClient   = getOfflineClient()
+    stateInit    = getStateInitFromTvc(tvcPath)
+    dataParams   = ParamsOfUpdateInitialData(data=stateInit.data, abi=getAbi(abiPath), initial_data=initialData, initial_pubkey=initialPubkey)
+    data         = everClient.abi.update_initial_data(params=dataParams).data
+
+    encodeParams = ParamsOfEncodeStateInit(code=stateInit.code, data=data, library=stateInit.library, tick=stateInit.tick, tock=stateInit.tock, split_depth=stateInit.split_depth)
+    encoded      = everClient.boc.encode_state_init(params=encodeParams).state_init
+    hashResult   = everClient.boc.get_boc_hash(params=ParamsOfGetBocHash(boc=encoded))
+
+    return str(workchainID) + ":" + hashResult.hash
+
+def _calculateAddressesChunk(args):
+    (abiPath, tvcPath, initialPubkey, initialDataArray, workchainID) = args
+    return [calculateAddress(abiPath, tvcPath, initialPubkey, initialData, workchainID) for initialData in initialDataArray]
+
+def calculateAddresses(abiPath, tvcPath, initialDataArray, initialPubkey: str = ZERO_PUBKEY, workchainID: int = 0, workers: int = None, chunkSize: int = 256):
+
+    chunks = [(abiPath, tvcPath, initialPubkey, initialDataArray[i:i + chunkSize], workchainID) for i in range(0, len(initialDataArray), chunkSize)]
+    if workers == 1 or len(chunks) <= 1:
+        results = map(_calculateAddressesChunk, chunks)
+        return [address for chunk in results for address in chunk]
+
+    # "spawn" because SDK runtime threads of the parent do not survive "fork"
+    with ProcessPoolExecutor(max_workers=workers, mp_context=multiprocessing.get_context("spawn")) as executor:
+        results = list(executor.map(_calculateAddressesChunk, chunks))
+    return [address for chunk in results for address in chunk]
+
 # ==============================================================================
 #
 def getAddress(abiPath, tvcPath, signer, initialPubkey, initialData):
 
-    everClient  = TonClient(config=ClientConfig())
-    (abi, tvc) = getAbiTvc(abiPath, tvcPath)
-    deploySet  = DeploySet(tvc=tvc, initial_pubkey=initialPubkey, initial_data=initialData)
-
-    params     = ParamsOfEncodeMessage(abi=abi, signer=signer, deploy_set=deploySet)
-    encoded    = everClient.abi.encode_message(params=params)
+    if initialPubkey is None and isinstance(signer, Signer.Keys):
+        initialPubkey = signer.keys.public
 
-    return encoded.address
+    return calculateAddress(abiPath=abiPath, tvcPath=tvcPath, initialPubkey=initialPubkey, initialData=initialData)
 
 # ==============================================================================
 #
@@ -173,7 +416,7 @@ def getAddressZeroPubkey(abiPath, tvcPath, initialData):
 #
 def prepareMessageBoc(abiPath, functionName, functionParams):
 
-    everClient = TonClient(config=ClientConfig())
+    everClient = getOfflineClient()
     callSet   = CallSet(function_name=functionName, input=functionParams)
     params    = ParamsOfEncodeMessageBody(abi=getAbi(abiPath), signer=Signer.NoSigner(), is_internal=True, call_set=callSet)
     encoded   = everClient.abi.encode_message_body(params=params)
@@ -203,6 +446,77 @@ def deployContract(everClient: TonClient, abiPath, tvcPath, constructorInput, in
         exceptionDetails = getValuesFromException(ever)
         return {"result": {}, "exception": exceptionDetails}
 
+# ==============================================================================
+# ACCOUNT BOC CACHE
+# Getters run locally on the account BOC. BOCs are kept per (client, address) and
+# reused while the account's `last_trans_lt` is unchanged, which costs a tiny query
+# instead of a full download; least recently used BOCs go first over the budget.
+ACCOUNT_CACHE_BYTES = 64 * 1024 * 1024
+
+_ACCOUNT_CACHE      = OrderedDict()
+_ACCOUNT_CACHE_LOCK = threading.Lock()
+
+def _dropAccountBoc(key):
+    with _ACCOUNT_CACHE_LOCK:
+        _ACCOUNT_CACHE.pop(key, None)
+
+def getAccountBoc(everClient: TonClient, contractAddress: str):
+
+    key = (id(everClient), contractAddress)
+    with _ACCOUNT_CACHE_LOCK:
+        cached = _ACCOUNT_CACHE.get(key)
+
+    if cached is not None:
+        result = getAccountGraphQL(everClient, contractAddress, "last_trans_lt")
+        if result == "":
+            _dropAccountBoc(key)
+            return ""
+        if result["last_trans_lt"] == cached[0]:
+            with _ACCOUNT_CACHE_LOCK:
+                if key in _ACCOUNT_CACHE:
+                    _ACCOUNT_CACHE.move_to_end(key)
+            return cached[1]
+
+    result = getAccountGraphQL(everClient, contractAddress, "boc, last_trans_lt")
+    if result == "" or result["boc"] is None:
+        _dropAccountBoc(key)
+        return ""
+
+    with _ACCOUNT_CACHE_LOCK:
+        _ACCOUNT_CACHE[key] = (result["last_trans_lt"], result["boc"])
+        _ACCOUNT_CACHE.move_to_end(key)
+        total = sum([len(boc) for (_, boc) in _ACCOUNT_CACHE.values()])
+        while total > ACCOUNT_CACHE_BYTES and len(_ACCOUNT_CACHE) > 1:
+            (_, (_, evicted)) = _ACCOUNT_CACHE.popitem(last=False)
+            total -= len(evicted)
+
+    return result["boc"]
+
+def clearAccountCache():
+    with _ACCOUNT_CACHE_LOCK:
+        _ACCOUNT_CACHE.clear()
+
+# ==============================================================================
+# Gas of an internal call from "srcAddress" measured locally: the message is executed on the
+# account BOC (or a BOC cache reference) with tvm.run_executor, nothing is sent. The gas limit
+# follows from "value" and the blockchain config the same way it does on-chain.
+# Returns {"gasUsed", "gasLimit", "exitCode", "account"}, "account" is the updated account BOC
+# with "returnAccount" and None otherwise.
+def estimateInternalGas(boc: str, abiPath, contractAddress, srcAddress, functionName, functionParams, value: int, returnAccount: bool = False):
+
+    everClient = getOfflineClient()
+    callSet    = CallSet(function_name=functionName, input=functionParams)
+    params     = ParamsOfEncodeInternalMessage(abi=getAbi(abiPath), address=contractAddress, src_address=srcAddress, call_set=callSet, value=str(value), bounce=True)
+    message    = everClient.abi.encode_internal_message(params=params).message
+
+    paramsRun  = ParamsOfRunExecutor(message=message, account=AccountForExecutor.Account(boc=boc), skip_transaction_check=True, return_updated_account=returnAccount)
+    result     = everClient.tvm.run_executor(params=paramsRun)
+    compute    = result.transaction.get("compute") or {}
+    return {"gasUsed":  int(str(compute.get("gas_used",  0)), 0),
+            "gasLimit": int(str(compute.get("gas_limit", 0)), 0),
+            "exitCode": compute.get("exit_code"),
+            "account":  result.account if returnAccount else None}
+
 # ==============================================================================
 #
 def runFunctionInternal(everClient: TonClient, boc: str, abiPath: str, contractAddress: str, functionName: str, functionParams):
@@ -227,13 +541,60 @@ def runFunctionInternal(everClient: TonClient, boc: str, abiPath: str, contractA
 
 def runFunction(everClient: TonClient, abiPath, contractAddress, functionName, functionParams):
 
-    result = getAccountGraphQL(everClient, contractAddress, "boc")
-    if result == "":
-        return ""
-    if result["boc"] is None:
+    boc = getAccountBoc(everClient, contractAddress)
+    if boc == "":
         return ""
 
-    return (runFunctionInternal(everClient=everClient, boc=result["boc"], abiPath=abiPath, contractAddress=contractAddress, functionName=functionName, functionParams=functionParams))
+    return (runFunctionInternal(everClient=everClient, boc=boc, abiPath=abiPath, contractAddress=contractAddress, functionName=functionName, functionParams=functionParams))
+
+# ==============================================================================
+# BATCH GETTERS
+# `calls` are (abiPath, address, functionName, functionParams) tuples. Account BOCs
+# are fetched with paged bulk queries, getters run locally on a process pool whose
+# workers keep their own offline client and pre-parsed ABIs; results are yielded in
+# input order as chunks complete ("" for missing accounts, like runFunction).
+def _initGetterWorker(abiPaths):
+    for abiPath in abiPaths:
+        getAbi(abiPath)
+
+def _runFunctionsChunk(args):
+    (calls, bocs, throw) = args
+    everClient = getOfflineClient()
+    results    = []
+
+    for (abiPath, contractAddress, functionName, functionParams) in calls:
+        boc = bocs.get(contractAddress)
+        if boc is None:
+            results.append("")
+            continue
+        try:
+            results.append(runFunctionInternal(everClient=everClient, boc=boc, abiPath=abiPath, contractAddress=contractAddress, functionName=functionName, functionParams=functionParams))
+        except TonException as ever:
+            if throw:
+                raise ever
+            results.append({"result": {}, "exception": getValuesFromException(ever)})
+
+    return results
+
+def runFunctionsBatch(everClient: TonClient, calls, workers: int = None, chunkSize: int = 64):
+
+    calls  = list(calls)
+    states = getAccountsStates(everClient=everClient, contractsArray=[call[1] for call in calls], fieldsArray=["boc"])
+    chunks = []
+    for i in range(0, len(calls), chunkSize):
+        chunk = calls[i:i + chunkSize]
+        bocs  = {call[1]: states[call[1]]["boc"] for call in chunk if call[1] in states}
+        chunks.append((chunk, bocs, THROW))
+
+    if workers == 1 or len(chunks) <= 1:
+        for chunk in chunks:
+            yield from _runFunctionsChunk(chunk)
+        return
+
+    abiPaths = set([call[0] for call in calls])
+    with ProcessPoolExecutor(max_workers=workers, mp_context=multiprocessing.get_context("spawn"), initializer=_initGetterWorker, initargs=(abiPaths,)) as executor:
+        for results in executor.map(_runFunctionsChunk, chunks):
+            yield from results
 
 # ==============================================================================
 #
@@ -265,30 +626,332 @@ def callFunction(everClient: TonClient, abiPath, contractAddress, functionName,
         return {"result": {}, "exception": exceptionDetails}
 
 # ==============================================================================
-#
-def decodeMessageBody(boc, possibleAbiFiles):
+# TELEMETRY
+# Stage timers and throughput counters of a long run (e.g. cli upload) plus fee totals
+# from transaction "total_fees"; report() gives a JSON-serializable summary.
+class Telemetry(object):
+    def __init__(self):
+        self.STARTED      = time.time()
+        self.STAGES       = {}   # name -> {"seconds", "latencySeconds", "items", "bytes"}
+        self.TRANSACTIONS = 0
+        self.FAILED       = 0
+        self.FEES         = 0
+        self.PAYLOAD      = 0    # bytes sent on-chain by counted transactions
+        self.ACTIVE       = {}   # name -> [stages running now, perf_counter when the first of them started]
+        self._lock        = threading.Lock()
+
+    def _entry(self, stage: str):
+        return self.STAGES.setdefault(stage, {"seconds": 0, "latencySeconds": 0, "items": 0, "bytes": 0})
+
+    # "seconds" of a serial piece of work count as both wall-clock time and latency
+    def add(self, stage: str, seconds: float = 0, items: int = 0, size: int = 0):
+        with self._lock:
+            entry = self._entry(stage)
+            entry["seconds"]        += seconds
+            entry["latencySeconds"] += seconds
+            entry["items"]          += items
+            entry["bytes"]          += size
+
+    # Stages may overlap (e.g. encode/send/wait of every message in MessagePipeline):
+    # "seconds" is the wall-clock time at least one of them was running,
+    # "latencySeconds" is the sum of their durations.
+    @contextlib.contextmanager
+    def stage(self, stage: str, items: int = 0, size: int = 0):
+        started = time.perf_counter()
+        with self._lock:
+            active = self.ACTIVE.setdefault(stage, [0, started])
+            if active[0] == 0:
+                active[1] = started
+            active[0] += 1
+        try:
+            yield
+        finally:
+            finished = time.perf_counter()
+            with self._lock:
+                entry  = self._entry(stage)
+                active = self.ACTIVE[stage]
+                active[0] -= 1
+                if active[0] == 0:
+                    entry["seconds"] += finished - active[1]
+                entry["latencySeconds"] += finished - started
+                entry["items"]          += items
+                entry["bytes"]          += size
+
+    # Takes a {"result", "exception"} dict as returned by calls and MessagePipeline
+    def addTransaction(self, result, size: int = 0):
+        with self._lock:
+            if result["exception"]["errorCode"] != 0:
+                self.FAILED += 1
+                return
+            self.TRANSACTIONS += 1
+            self.PAYLOAD      += size
+            self.FEES         += int(str(result["result"].transaction.get("total_fees", 0)), 0)
+
+    def report(self):
+        elapsed = time.time() - self.STARTED
+        stages  = {}
+        for name, entry in self.STAGES.items():
+            seconds      = entry["seconds"]
+            stages[name] = dict(entry, itemsPerSecond = entry["items"] / seconds if seconds > 0 else 0,
+                                       bytesPerSecond = entry["bytes"] / seconds if seconds > 0 else 0)
+        return {"elapsed":               elapsed,
+                "stages":                stages,
+                "transactions":          self.TRANSACTIONS,
+                "failedTransactions":    self.FAILED,
+                "transactionsPerSecond": self.TRANSACTIONS / elapsed if elapsed > 0 else 0,
+                "payloadBytes":          self.PAYLOAD,
+                "fees":                  self.FEES,
+                "feesPerKB":             self.FEES * 1024 / self.PAYLOAD if self.PAYLOAD > 0 else 0}
+
+    def save(self, path: str):
+        with open(path, "w") as fp:
+            json.dump(self.report(), fp, indent=4)
 
-    everClient = TonClient(config=ClientConfig())
+# ==============================================================================
+# ASYNC MESSAGE PIPELINE
+# Messages are encoded and sent immediately, waiting for their transactions overlaps
+# with at most `window` messages in flight. Every submitted message gets an explicit
+# `expire` header and the wait is given the ABI, so the SDK itself stops waiting
+# (MessageExpired) once a block past `expire` shows up. Futures resolve to
+# the same {"result", "exception"} dict as callFunction/deployContract.
+MESSAGE_EXPIRATION = 60
+EXPIRATION_GRACE   = 40   # Backstop past `expire` for a wait the SDK didn't end (same as its message_processing_timeout)
+
+expiredException = {"errorCode":"", "errorMessage":"Message expired", "transactionID": "", "errorDesc": ""}
+
+class MessagePipeline(object):
+    # "throw" overrides THROW: with False failed and expired messages resolve to results instead of raising
+    def __init__(self, everClient: TonClient, window: int = 16, expiration: int = MESSAGE_EXPIRATION, telemetry: Telemetry = None, throw: bool = None):
+        self.EVERCLIENT = everClient
+        self.WINDOW     = window
+        self.EXPIRATION = expiration
+        self.TELEMETRY  = telemetry
+        self.THROW      = THROW if throw is None else throw
+        self.INFLIGHT   = {}   # message hash -> expire timestamp
+        self._executor  = ThreadPoolExecutor(max_workers=window)
+        self._semaphore = None
+        self._tasks     = []
 
-    # EXTERNAL
-    for abi in possibleAbiFiles:
-        try:
-            params = ParamsOfDecodeMessageBody(abi=getAbi(abi), body=boc, is_internal=False)
-            result = everClient.abi.decode_message_body(params=params)
-            return (abi, result)
+    # ========================================
+    #
+    def call(self, abiPath, contractAddress, functionName, functionParams, signer) -> asyncio.Future:
+        def encode(expire):
+            abi     = getAbi(abiPath)
+            callSet = CallSet(function_name=functionName, header=FunctionHeader(expire=expire), input=functionParams)
+            params  = ParamsOfEncodeMessage(abi=abi, address=contractAddress, signer=signer, call_set=callSet)
+            return (abi, self.EVERCLIENT.abi.encode_message(params=params))
 
-        except TonException as ever:
-            pass
+        return self._submit(encode)
 
-    # INTERNAL
-    for abi in possibleAbiFiles:
+    def deploy(self, abiPath, tvcPath, constructorInput, initialData, signer, initialPubkey) -> asyncio.Future:
+        def encode(expire):
+            (abi, tvc) = getAbiTvc(abiPath, tvcPath)
+            callSet    = CallSet(function_name='constructor', header=FunctionHeader(expire=expire), input=constructorInput)
+            deploySet  = DeploySet(tvc=tvc, initial_pubkey=initialPubkey, initial_data=initialData)
+            params     = ParamsOfEncodeMessage(abi=abi, signer=signer, call_set=callSet, deploy_set=deploySet)
+            return (abi, self.EVERCLIENT.abi.encode_message(params=params))
+
+        return self._submit(encode)
+
+    async def join(self):
+        tasks       = self._tasks
+        self._tasks = []
+        return await asyncio.gather(*tasks)
+
+    def close(self):
+        self._executor.shutdown(wait=False)
+
+    # ========================================
+    #
+    def _submit(self, encode) -> asyncio.Future:
+        if self._semaphore is None:
+            self._semaphore = asyncio.Semaphore(self.WINDOW)
+
+        task = asyncio.ensure_future(self._process(encode))
+        self._tasks.append(task)
+        return task
+
+    def _stage(self, stage: str):
+        if self.TELEMETRY is None:
+            return contextlib.nullcontext()
+        return self.TELEMETRY.stage(stage, items=1)
+
+    async def _process(self, encode):
+        loop = asyncio.get_running_loop()
+
+        async with self._semaphore:
+            messageHash = None
+            try:
+                expire         = getNowTimestamp() + self.EXPIRATION
+                with self._stage("encode"):
+                    (abi, encoded) = await loop.run_in_executor(self._executor, encode, expire)
+                messageHash    = encoded.message_id
+                self.INFLIGHT[messageHash] = expire
+
+                messageParams  = ParamsOfSendMessage(message=encoded.message, send_events=False, abi=abi)
+                with self._stage("send"):
+                    messageResult = await loop.run_in_executor(self._executor, lambda: self.EVERCLIENT.processing.send_message(params=messageParams))
+
+                # The SDK reads `expire` from the message through the ABI and ends the wait itself,
+                # wait_for only keeps a stuck connection from holding the pipeline forever
+                waitParams     = ParamsOfWaitForTransaction(message=encoded.message, shard_block_id=messageResult.shard_block_id, send_events=False, abi=abi, sending_endpoints=messageResult.sending_endpoints)
+                waitFuture     = loop.run_in_executor(self._executor, lambda: self.EVERCLIENT.processing.wait_for_transaction(params=waitParams))
+                timeout        = max(expire - getNowTimestamp(), 0) + EXPIRATION_GRACE
+                try:
+                    with self._stage("wait"):
+                        result = await asyncio.wait_for(waitFuture, timeout=timeout)
+                except asyncio.TimeoutError:
+                    if self.THROW:
+                        raise
+                    return {"result": {}, "exception": expiredException}
+
+                return {"result": result, "exception": emptyException}
+
+            except TonException as ever:
+                if self.THROW:
+                    raise ever
+                exceptionDetails = getValuesFromException(ever)
+                return {"result": {}, "exception": exceptionDetails}
+
+            finally:
+                if messageHash is not None:
+                    self.INFLIGHT.pop(messageHash, None)
+
+# Runs `submitFunctions` (callables that take a MessagePipeline and submit messages)
+# through one pipeline, results come back in submission order.
+def processMessagesAsync(everClient: TonClient, submitFunctions, window: int = 16, telemetry: Telemetry = None, throw: bool = None):
+    async def _run():
+        pipeline = MessagePipeline(everClient=everClient, window=window, telemetry=telemetry, throw=throw)
         try:
-            params = ParamsOfDecodeMessageBody(abi=getAbi(abi), body=boc, is_internal=True)
-            result = everClient.abi.decode_message_body(params=params)
+            for submit in submitFunctions:
+                submit(pipeline)
+            return await pipeline.join()
+        finally:
+            pipeline.close()
+
+    return asyncio.run(_run())
+
+# ==============================================================================
+# FUNCTION SELECTOR INDEX
+# Function/event IDs are calculated from ABI signatures (same as the SDK does), so a
+# body is decoded with one targeted call against the ABI that owns its ID. ABIs
+# older than v2 are not indexed and are tried the old way as a last resort.
+def _abiTypeSignature(param):
+    kind = param["type"]
+    if "components" in param and param["components"]:
+        components = "(" + ",".join([_abiTypeSignature(component) for component in param["components"]]) + ")"
+        kind = kind.replace("tuple", components)
+    return kind
+
+def _calcFunctionID(signature: str):
+    return int.from_bytes(hashlib.sha256(signature.encode()).digest()[:4], "big")
+
+def _loadSelectorIndex(abiPath):
+    with open(abiPath) as f:
+        abiJson = json.load(f)
+
+    version = str(abiJson.get("version", abiJson.get("ABI version", 1)))
+    major   = int(version.split(".")[0])
+    if major < 2:
+        return None
+
+    entries = {}
+    for function in abiJson.get("functions", []):
+        inputs  = ",".join([_abiTypeSignature(param) for param in function["inputs"]])
+        outputs = ",".join([_abiTypeSignature(param) for param in function["outputs"]])
+        if "id" in function:
+            functionID = int(function["id"], 0)
+        else:
+            functionID = _calcFunctionID(f"{function['name']}({inputs})({outputs})v{major}")
+        entries.setdefault(functionID & 0x7FFFFFFF, []).append((function["name"], "input"))
+        entries.setdefault(functionID | 0x80000000, []).append((function["name"], "output"))
+
+    for event in abiJson.get("events", []):
+        inputs  = ",".join([_abiTypeSignature(param) for param in event["inputs"]])
+        eventID = int(event["id"], 0) if "id" in event else _calcFunctionID(f"{event['name']}({inputs})v{major}")
+        entries.setdefault(eventID & 0x7FFFFFFF, []).append((event["name"], "event"))
+
+    return {"headers": tuple(abiJson.get("header", [])), "entries": entries}
+
+# External inbound bodies: maybe(signature), headers in ABI order, function ID
+def _getExternalFunctionID(cell, headers):
+    (data, bits, _) = cell
+    signed = _readBits(data, bits, 0, 1)
+    if signed is None:
+        return None
+
+    offset = 1 + (512 if signed else 0)
+    for header in headers:
+        if header == "pubkey":
+            hasPubkey = _readBits(data, bits, offset, 1)
+            if hasPubkey is None:
+                return None
+            offset += 1 + (256 if hasPubkey else 0)
+        elif header == "time":
+            offset += 64
+        elif header == "expire":
+            offset += 32
+    return _readBits(data, bits, offset, 32)
+
+def getSelectorIndex(abiFilesArray):
+    index     = {}
+    layouts   = {}
+    unindexed = []
+    for abi in abiFilesArray:
+        abiIndex = _getCachedArtifact("selectors", abi, _loadSelectorIndex)
+        if abiIndex is None:
+            unindexed.append(abi)
+            continue
+        layouts.setdefault(abiIndex["headers"], []).append(abi)
+        for functionID, names in abiIndex["entries"].items():
+            for (name, kind) in names:
+                index.setdefault(functionID, []).append((abi, name, kind))
+    return (index, layouts, unindexed)
+
+# ==============================================================================
+#
+def _decodeMessageBodyWithAbi(everClient: TonClient, boc, abi, isInternal: bool):
+    try:
+        params = ParamsOfDecodeMessageBody(abi=getAbi(abi), body=boc, is_internal=isInternal)
+        result = everClient.abi.decode_message_body(params=params)
+        return result
+    except TonException as ever:
+        return None
+
+def decodeMessageBody(boc, possibleAbiFiles):
+
+    everClient = getOfflineClient()
+    (index, layouts, unindexed) = getSelectorIndex(possibleAbiFiles)
+    try:
+        (cells, roots) = parseBoc(boc)
+        root = cells[roots[0]]
+    except (ValueError, IndexError):
+        return ("", "")
+
+    candidates = []
+
+    # EXTERNAL
+    for headers, abiFiles in layouts.items():
+        functionID = _getExternalFunctionID(root, headers)
+        for (abi, name, kind) in index.get(functionID, []):
+            if kind == "input" and abi in abiFiles:
+                candidates.append((abi, False))
+
+    # INTERNAL, function outputs and events
+    functionID = _readBits(root[0], root[1], 0, 32)
+    for (abi, name, kind) in index.get(functionID, []):
+        candidates.append((abi, kind == "input"))
+
+    for (abi, isInternal) in dict.fromkeys(candidates):
+        result = _decodeMessageBodyWithAbi(everClient, boc, abi, isInternal)
+        if result is not None:
             return (abi, result)
 
-        except TonException as ever:
-            pass
+    for isInternal in (False, True):
+        for abi in unindexed:
+            result = _decodeMessageBodyWithAbi(everClient, boc, abi, isInternal)
+            if result is not None:
+                return (abi, result)
 
     return ("", "")
 
@@ -312,6 +975,68 @@ def getAccountGraphQL(everClient: TonClient, accountID, fields):
     else:
         return ""
 
+# ==============================================================================
+# BULK QUERIES
+# Keys (account IDs, message IDs, ...) are split into pages and queried with an
+# `in` filter; a page is re-queried past its last returned key until the server
+# answers with nothing (or every key is found), servers may return fewer documents
+# than the limit. Field projections are merged, results are keyed dicts.
+# getAccountsStates() accepts wrappers (anything with ADDRESS) or raw addresses.
+GRAPHQL_PAGE_SIZE = 50
+
+def _splitFields(fields: str):
+    result = []
+    depth  = 0
+    start  = 0
+    for i, char in enumerate(fields):
+        if char in "({":
+            depth += 1
+        elif char in ")}":
+            depth -= 1
+        elif char == "," and depth == 0:
+            result.append(fields[start:i].strip())
+            start = i + 1
+    result.append(fields[start:].strip())
+    return [field for field in result if field != ""]
+
+def mergeFields(fieldsArray, keyField: str = "id"):
+    merged = [keyField]
+    for fields in fieldsArray:
+        for field in _splitFields(fields):
+            if field not in merged:
+                merged.append(field)
+    return ", ".join(merged)
+
+def queryCollectionByKeys(everClient: TonClient, collection: str, keyField: str, keysArray, fieldsArray, pageSize: int = GRAPHQL_PAGE_SIZE):
+
+    keys    = list(dict.fromkeys(keysArray))
+    fields  = mergeFields(fieldsArray, keyField)
+    results = {}
+
+    for i in range(0, len(keys), pageSize):
+        page   = keys[i:i + pageSize]
+        filter = {keyField:{"in":page}}
+        while True:
+            paramsCollection = ParamsOfQueryCollection(
+            collection=collection, result=fields, limit=pageSize,
+            filter=filter,
+            order=[OrderBy(path=keyField, direction=SortDirection.ASC)])
+
+            result = everClient.net.query_collection(params=paramsCollection).result
+            for item in result:
+                results[item[keyField]] = item
+
+            # The server may cap results below "limit", only an empty answer (or every key found) ends the page
+            if len(result) == 0 or all(key in results for key in page):
+                break
+            filter = {keyField:{"in":page, "gt":result[-1][keyField]}}
+
+    return results
+
+def getAccountsStates(everClient: TonClient, contractsArray, fieldsArray, pageSize: int = GRAPHQL_PAGE_SIZE):
+    addresses = [getattr(contract, "ADDRESS", contract) for contract in contractsArray]
+    return queryCollectionByKeys(everClient=everClient, collection="accounts", keyField="id", keysArray=addresses, fieldsArray=fieldsArray, pageSize=pageSize)
+
 # ==============================================================================
 #
 def getMessageGraphQL(everClient: TonClient, messageID, fields):
@@ -363,12 +1088,43 @@ def getExitCodeFromMessageID(everClient: TonClient, messageID, fields):
 
 # ==============================================================================
 #
-def unwrapMessages(everClient: TonClient, messageIdArray, abiFilesArray):
+UNWRAP_MSG_FIELDS = "id, src, dst, body, dst_transaction{id}, value(format:DEC), ihr_fee(format:DEC), import_fee(format:DEC), fwd_fee(format:DEC)"
+UNWRAP_TX_FIELDS  = "id, in_msg, status, status_name, end_status, out_msgs, outmsg_cnt, aborted, compute{exit_arg, exit_code, skipped_reason, skipped_reason_name, gas_fees(format:DEC)}, total_fees(format:DEC), storage{storage_fees_collected(format:DEC)}"
+
+def _loadAbiNames(abiPath):
+    with open(abiPath) as f:
+        abiJson = json.load(f)
+    return set([function["name"] for function in abiJson.get("functions", [])] + [event["name"] for event in abiJson.get("events", [])])
+
+def abiHasFunction(abiPath, name: str):
+    return name in _getCachedArtifact("names", abiPath, _loadAbiNames)
+
+def _findAbiByName(name, abiFilesArray):
+    candidates = [abi for abi in abiFilesArray if name in _getCachedArtifact("names", abi, _loadAbiNames)]
+    return candidates[0] if len(candidates) == 1 else ""
+
+def _getMessagesDepth(treeResult, initialMsg):
+    msgByDstTx = {msg.dst_transaction_id: msg for msg in treeResult.messages if msg.dst_transaction_id is not None}
+    depths     = {}
+
+    def _depth(msg):
+        if msg.id not in depths:
+            parent = msgByDstTx.get(msg.src_transaction_id)
+            depths[msg.id] = 0 if (msg.id == initialMsg or parent is None or parent.id == msg.id) else _depth(parent) + 1
+        return depths[msg.id]
+
+    for msg in treeResult.messages:
+        _depth(msg)
+    return depths
+
+# Message tree is fetched once per initial message, message and transaction details
+# for the whole set are fetched in batched `in` queries; bodies decoded by
+# `query_transaction_tree` are reused, decodeMessageBody() is a fallback only.
+def unwrapMessages(everClient: TonClient, messageIdArray, abiFilesArray, maxDepth: int = None, msgFields: str = UNWRAP_MSG_FIELDS, txFields: str = UNWRAP_TX_FIELDS):
 
     arrayMsg    = []
     abiRegistry = []
-    msgFilters  = "id, src, dst, body, dst_transaction{id}, value(format:DEC), ihr_fee(format:DEC), import_fee(format:DEC), fwd_fee(format:DEC)"
-    txFilters   = "id, status, status_name, end_status, out_msgs, outmsg_cnt, aborted, compute{exit_arg, exit_code, skipped_reason, skipped_reason_name, gas_fees(format:DEC)}, total_fees(format:DEC), storage{storage_fees_collected(format:DEC)}"
+    treeMsgs    = []
 
     for abi in abiFilesArray:
         abiRegistry.append(getAbi(abi))
@@ -376,29 +1132,46 @@ def unwrapMessages(everClient: TonClient, messageIdArray, abiFilesArray):
     for initialMsg in messageIdArray:
         treeParams = ParamsOfQueryTransactionTree(in_msg=initialMsg, abi_registry=abiRegistry)
         treeResult = everClient.net.query_transaction_tree(params=treeParams)
+        depths     = _getMessagesDepth(treeResult, initialMsg)
 
-        for msg in treeResult.messages:
-            resultMsg            = getMessageGraphQL(everClient, msg.id, msgFilters)
-            resultTx             = getTransactionGraphQL(everClient, msg.id, txFilters)
-            (abi, resultMsgBody) = decodeMessageBody(resultMsg["body"], abiFilesArray)
+        treeMsgs  += [msg for msg in treeResult.messages if maxDepth is None or depths[msg.id] <= maxDepth]
 
-            elm = [{
-                "SOURCE":             resultMsg["src"],
-                "DEST":               resultMsg["dst"] if resultMsg["dst"] != "" else "---",
-                "VALUE":              resultMsg["value"],
-                "FEES":               {"ihr_fee":resultMsg["ihr_fee"], "import_fee":resultMsg["import_fee"], "fwd_fee":resultMsg["fwd_fee"]},
-                "MESSAGE_ID:":        msg.id,
-                "PARENT_TX_ID:":      msg.src_transaction_id,
-                "TARGET_ABI":         abi,
-                "CALL_TYPE":          resultMsgBody.body_type if resultMsgBody != "" else "---",
-                "FUNCTION_NAME":      resultMsgBody.name      if resultMsgBody != "" else "---",
-                "FUNCTION_PARAMS":    resultMsgBody.value     if resultMsgBody != "" else "---",
-                "MSG_HEADER":         resultMsgBody.header    if resultMsgBody != "" else "---",
-                "OUT_MSGS":           resultTx["out_msgs"]    if resultTx      != "" else [],
-                "OUT_MSG_CNT":        resultTx["outmsg_cnt"]  if resultTx      != "" else 0,
-                "TX_DETAILS":         resultTx                if resultTx      != "" else "---"
-            }]
-            arrayMsg += elm
+    msgIDs     = [msg.id for msg in treeMsgs]
+    resultMsgs = queryCollectionByKeys(everClient=everClient, collection="messages",     keyField="id",     keysArray=msgIDs, fieldsArray=[msgFields])
+    resultTxs  = queryCollectionByKeys(everClient=everClient, collection="transactions", keyField="in_msg", keysArray=msgIDs, fieldsArray=[txFields])
+
+    for msg in treeMsgs:
+        resultMsg = resultMsgs.get(msg.id, {})
+        resultTx  = resultTxs.get(msg.id, "")
+
+        if msg.decoded_body is not None:
+            resultMsgBody = msg.decoded_body
+            abi           = _findAbiByName(resultMsgBody.name, abiFilesArray)
+            if abi == "" and resultMsg.get("body") is not None:
+                (abi, _) = decodeMessageBody(resultMsg["body"], abiFilesArray)
+        elif resultMsg.get("body") is not None:
+            (abi, resultMsgBody) = decodeMessageBody(resultMsg["body"], abiFilesArray)
+        else:
+            (abi, resultMsgBody) = ("", "")
+
+        dest = resultMsg.get("dst", msg.dst)
+        elm = [{
+            "SOURCE":             resultMsg.get("src", msg.src),
+            "DEST":               dest if dest not in ("", None) else "---",
+            "VALUE":              resultMsg.get("value", msg.value),
+            "FEES":               {"ihr_fee":resultMsg.get("ihr_fee"), "import_fee":resultMsg.get("import_fee"), "fwd_fee":resultMsg.get("fwd_fee")},
+            "MESSAGE_ID:":        msg.id,
+            "PARENT_TX_ID:":      msg.src_transaction_id,
+            "TARGET_ABI":         abi,
+            "CALL_TYPE":          resultMsgBody.body_type if resultMsgBody != "" else "---",
+            "FUNCTION_NAME":      resultMsgBody.name      if resultMsgBody != "" else "---",
+            "FUNCTION_PARAMS":    resultMsgBody.value     if resultMsgBody != "" else "---",
+            "MSG_HEADER":         resultMsgBody.header    if resultMsgBody != "" else "---",
+            "OUT_MSGS":           resultTx["out_msgs"]    if resultTx      != "" else [],
+            "OUT_MSG_CNT":        resultTx["outmsg_cnt"]  if resultTx      != "" else 0,
+            "TX_DETAILS":         resultTx                if resultTx      != "" else "---"
+        }]
+        arrayMsg += elm
 
     return arrayMsg
 
@@ -421,10 +1194,18 @@ class BaseContract(object):
         result = deployContract(everClient=self.EVERCLIENT, abiPath=self.ABI, tvcPath=self.TVC, constructorInput=self.CONSTRUCTOR, initialData=self.INITDATA, signer=self.SIGNER, initialPubkey=self.PUBKEY)
         return result
 
+    def deployAsync(self, pipeline: MessagePipeline) -> asyncio.Future:
+        result = pipeline.deploy(abiPath=self.ABI, tvcPath=self.TVC, constructorInput=self.CONSTRUCTOR, initialData=self.INITDATA, signer=self.SIGNER, initialPubkey=self.PUBKEY)
+        return result
+
     def _call(self, functionName, functionParams, signer):
         result = callFunction(everClient=self.EVERCLIENT, abiPath=self.ABI, contractAddress=self.ADDRESS, functionName=functionName, functionParams=functionParams, signer=signer)
         return result
 
+    def _callAsync(self, pipeline: MessagePipeline, functionName, functionParams, signer) -> asyncio.Future:
+        result = pipeline.call(abiPath=self.ABI, contractAddress=self.ADDRESS, functionName=functionName, functionParams=functionParams, signer=signer)
+        return result
+
     def _run(self, functionName, functionParams):
         result = runFunction(everClient=self.EVERCLIENT, abiPath=self.ABI, contractAddress=self.ADDRESS, functionName=functionName, functionParams=functionParams)
         return result
@@ -434,6 +1215,11 @@ class BaseContract(object):
         result     = msig.sendTransaction(addressDest=self.ADDRESS, value=value, bounce=bounce, payload=messageBoc, flags=flags)
         return result
 
+    def _callFromMultisigAsync(self, pipeline: MessagePipeline, msig, functionName, functionParams, value, flags, bounce=True) -> asyncio.Future:
+        messageBoc = prepareMessageBoc(abiPath=self.ABI, functionName=functionName, functionParams=functionParams)
+        result     = msig.sendTransactionAsync(pipeline=pipeline, addressDest=self.ADDRESS, value=value, bounce=bounce, payload=messageBoc, flags=flags)
+        return result
+
     def getBalance(self):
         result = getAccountGraphQL(everClient=self.EVERCLIENT, accountID=self.ADDRESS, fields="balance(format:DEC)")
         return int(result["balance"]) if result != "" else 0
@@ -459,6 +1245,10 @@ class Multisig(BaseContract):
         result = self._call(functionName="sendTransaction", functionParams={"dest":addressDest, "value":value, "bounce":bounce, "flags":flags, "payload":payload}, signer=self.SIGNER)
         return result
 
+    def sendTransactionAsync(self, pipeline: MessagePipeline, addressDest, value, bounce=False, payload="", flags=1) -> asyncio.Future:
+        result = self._callAsync(pipeline=pipeline, functionName="sendTransaction", functionParams={"dest":addressDest, "value":value, "bounce":bounce, "flags":flags, "payload":payload}, signer=self.SIGNER)
+        return result
+
 # ==============================================================================
 #
 class Giver(BaseContract):
@@ -517,7 +1307,7 @@ def giverGetAddress():
         return "0:841288ed3b55d9cdafa806807f02a0ae0c169aa5edfe88a789a6482429756a94"
     else:
         signer = loadSigner(MSIG_GIVER)
-        msig   = SetcodeMultisig(everClient=TonClient(config=ClientConfig()), signer=signer)
+        msig   = SetcodeMultisig(everClient=getOfflineClient(), signer=signer)
         return msig.ADDRESS
 
 def giverGive(everClient: TonClient, contractAddress, amountEvers):
@@ -533,7 +1323,7 @@ def giverGive(everClient: TonClient, contractAddress, amountEvers):
         callFunction(everClient, "../bin/local_giver.abi.json", giverAddress, "sendGrams", {"dest":contractAddress,"amount":amountEvers}, Signer.NoSigner())
     else:
         signer = loadSigner(MSIG_GIVER)
-        msig   = SetcodeMultisig(signer=signer)
+        msig   = SetcodeMultisig(everClient=everClient, signer=signer)
         msig.callTransfer(addressDest=contractAddress, value=amountEvers, payload="", flags=1)
 
 # ==============================================================================
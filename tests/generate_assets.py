@@ -1,17 +1,26 @@
 #!/usr/bin/env python3
 
 # ==============================================================================
-# 
+#
 import time
 import os
 import sys
 import random
 import json
+import hashlib
+import click
+from collections import OrderedDict
+from concurrent.futures import ProcessPoolExecutor
 from PIL import Image
 from pprint import pprint
 
+try:
+    import numpy
+except ImportError:
+    numpy = None
+
 # ==============================================================================
-# 
+#
 defaultMeta = {
     "name"  : "Test Degen EVER #",
     "symbol": "TDEVER",
@@ -32,30 +41,179 @@ defaultMeta = {
 }
 
 # ==============================================================================
-# 
+# Sorted, so that files match their traits on any file system
 def getFilesInFolder(folder: str, extension: str):
     files = []
-    for file in os.listdir(folder):
+    for file in sorted(os.listdir(folder)):
         if file.endswith(extension):
             files.append(os.path.join(folder, file))
     return files
 
 # ==============================================================================
-# 
-backgrounds = getFilesInFolder("./assets_raw/background", ".png")
-balls       = getFilesInFolder("./assets_raw/ball",       ".png")
-eyes        = getFilesInFolder("./assets_raw/eye_color",  ".png")
-iriss       = getFilesInFolder("./assets_raw/iris",       ".png")
-shines      = getFilesInFolder("./assets_raw/shine",      ".png")
-bottoms     = getFilesInFolder("./assets_raw/bottom_lid", ".png")
-tops        = getFilesInFolder("./assets_raw/top_lid",    ".png")
+# Decoded RGBA layers, every file is opened and converted once and then reused.
+# Least recently used layers are dropped when the budget (in bytes of pixel data) is exceeded.
+# Returned images are shared, copy them before drawing on them.
+LAYER_CACHE_BYTES = 512 * 1024 * 1024
+
+class LayerStore(object):
+    def __init__(self, budget: int = LAYER_CACHE_BYTES):
+        self.BUDGET = budget
+        self.SIZE   = 0
+        self.LAYERS = OrderedDict()
+
+    def get(self, path: str):
+        if path in self.LAYERS:
+            self.LAYERS.move_to_end(path)
+            return self.LAYERS[path]
+
+        with Image.open(path) as image:
+            layer = image.convert('RGBA')
+        layer.load()
+
+        self.LAYERS[path] = layer
+        self.SIZE += layer.width * layer.height * 4
+        while self.SIZE > self.BUDGET and len(self.LAYERS) > 1:
+            (_, evicted) = self.LAYERS.popitem(last=False)
+            self.SIZE -= evicted.width * evicted.height * 4
+        return layer
+
+# ==============================================================================
+# Intermediate composites keyed by the prefix of picked layer indexes (a trie over layers
+# flattened into a dict). Rendering starts from the longest cached prefix and blends only
+# the remaining layers; blending order is the same as without the cache, so the output
+# is identical. Least recently used composites are dropped above the budget.
+COMPOSITE_CACHE_BYTES = 256 * 1024 * 1024
+
+class CompositeCache(object):
+    def __init__(self, store: LayerStore, budget: int = COMPOSITE_CACHE_BYTES):
+        self.STORE      = store
+        self.BUDGET     = budget
+        self.SIZE       = 0
+        self.COMPOSITES = OrderedDict()
+        self.HITS       = 0
+        self.BLENDS     = 0
+
+    def _put(self, key, image):
+        self.COMPOSITES[key] = image
+        self.SIZE += image.width * image.height * 4
+        while self.SIZE > self.BUDGET and len(self.COMPOSITES) > 1:
+            (_, evicted) = self.COMPOSITES.popitem(last=False)
+            self.SIZE -= evicted.width * evicted.height * 4
+
+    # Returns a new image with all "paths" blended bottom to top, "picked" is their index tuple
+    def render(self, paths, picked):
+        picked = tuple(picked)
+        depth  = len(paths) - 1
+        while depth > 1 and picked[:depth] not in self.COMPOSITES:
+            depth -= 1
+
+        if depth > 1:
+            self.HITS += 1
+            current = self.COMPOSITES[picked[:depth]]
+            self.COMPOSITES.move_to_end(picked[:depth])
+        else:
+            current = self.STORE.get(paths[0])
+            depth   = 1
+
+        # Every prefix except the full image is cached for the next tokens
+        while depth < len(paths):
+            blended = current.copy()
+            blended.alpha_composite(self.STORE.get(paths[depth]), (0, 0), (0, 0))
+            self.BLENDS += 1
+            depth   += 1
+            if depth < len(paths):
+                self._put(picked[:depth], blended)
+            current = blended
+
+        return current if len(paths) > 1 else current.copy()
+
+# ==============================================================================
+# Optional NumPy backend, bit-exact with PIL's alpha_composite (libImaging/AlphaComposite.c):
+#   coef1 = sa * 255 * 255 * 128 // outa255, coef2 = 255 * 128 - coef1
+#   out   = DIV255(src * coef1 + dst * coef2 + (0x80 << 7)) >> 7
+# where DIV255(a) = ((a >> 8) + a) >> 8. Over an opaque destination coef1 = sa * 128, so layers
+# are kept sparse and pre-multiplied: fully opaque pixels are copied as whole uint32 pixels with a mask,
+# partially transparent ones are stored as (src * sa * 128, (255 - sa) * 128) and blended with one
+# multiply-add, transparent ones are skipped; the destination stays opaque.
+# Tokens are rendered into a preallocated batch buffer.
+def _div255(value):
+    return ((value >> 8) + value) >> 8
+
+def _compositeGeneral(dst, src):
+    d       = dst.astype(numpy.uint32)
+    s       = src.astype(numpy.uint32)
+    sa      = s[..., 3:4]
+    outa255 = sa * 255 + d[..., 3:4] * (255 - sa)
+    coef1   = sa * 255 * 255 * 128 // numpy.maximum(outa255, 1)
+    coef2   = 255 * 128 - coef1
+    rgb     = _div255(s[..., :3] * coef1 + d[..., :3] * coef2 + (0x80 << 7)) >> 7
+    alpha   = _div255(outa255 + 0x80)
+    out     = numpy.concatenate([rgb, alpha], axis=2).astype(numpy.uint8)
+    return numpy.where(sa == 0, dst, out)
+
+class NumpyCompositor(object):
+    def __init__(self, store: LayerStore, batch: int = 16):
+        if numpy is None:
+            raise ImportError("NumPy backend requires numpy to be installed")
+        self.STORE  = store
+        self.BATCH  = batch
+        self.LAYERS = {}     # path -> (rgba, opaque, rgba as uint32 pixels, solid mask, partial indexes, pre-multiplied rgb, inverse alpha)
+        self.OUTPUT = None   # (batch, height, width, 4) uint8
+
+    def _layer(self, path: str):
+        if path not in self.LAYERS:
+            rgba    = numpy.asarray(self.STORE.get(path)).copy()
+            flat    = rgba.reshape(-1, 4)
+            alpha   = flat[:, 3]
+            solid   = alpha == 255
+            partial = numpy.flatnonzero((alpha > 0) & (alpha < 255))
+            sa      = alpha[partial, None].astype(numpy.uint32)
+            self.LAYERS[path] = (rgba, bool(solid.all()), flat.view(numpy.uint32).ravel(), solid, partial, flat[partial, :3].astype(numpy.uint32) * sa * 128, (255 - sa) * 128)
+        return self.LAYERS[path]
+
+    def _allocate(self, shape):
+        if self.OUTPUT is None or self.OUTPUT.shape[1:3] != shape[:2]:
+            self.OUTPUT = numpy.empty((self.BATCH,) + shape[:2] + (4,), dtype=numpy.uint8)
+
+    def _blendOpaque(self, out, layer):
+        (_, _, pixels, solid, partial, pre, inv) = layer
+        flat = out.reshape(-1, 4).view(numpy.uint32).ravel()
+        numpy.copyto(flat, pixels, where=solid)
+        if len(partial) > 0:
+            dst   = flat[partial].view(numpy.uint8).reshape(-1, 4)
+            value = dst[:, :3] * inv + pre + (0x80 << 7)
+            dst[:, :3] = ((value >> 8) + value) >> 15
+            flat[partial] = dst.view(numpy.uint32).ravel()
+
+    # Renders up to BATCH tokens; returned images share the batch buffer and are valid until the next call
+    def renderBatch(self, pathsList):
+        if len(pathsList) > self.BATCH:
+            raise ValueError(f"Batch of {len(pathsList)} tokens is bigger than the buffer ({self.BATCH})")
 
+        images = []
+        for slot, paths in enumerate(pathsList):
+            (rgba, opaque) = self._layer(paths[0])[:2]
+            self._allocate(rgba.shape)
+            out = self.OUTPUT[slot]
+            numpy.copyto(out, rgba)
+            for path in paths[1:]:
+                layer = self._layer(path)
+                if opaque:
+                    self._blendOpaque(out, layer)
+                else:
+                    out[...] = _compositeGeneral(out, layer[0])
+                    opaque   = bool((out[..., 3] == 255).all())
+            images.append(Image.fromarray(out))
+        return images
+
+# ==============================================================================
+# Layers from bottom to top: (folder, probabilities, traits)
 backgroundsProbabilities = [100]
 backgroundsTraits        = [{"Background": "Black"}]
 ballsProbabilities       = [10, 90]
 ballsTraits              = [{"Ball Color": "Red"}, {"Ball Color": "White"}]
 eyesProbabilities        = [3,10,7,10,15,5,5,10,9,6,19,1]
-eyesTraits               = [{"Eye Color": "Cyan Big"},   {"Eye Color": "Cyan Small"}, 
+eyesTraits               = [{"Eye Color": "Cyan Big"},   {"Eye Color": "Cyan Small"},
                             {"Eye Color": "Green Big"},  {"Eye Color": "Green Small"},
                             {"Eye Color": "Pink Big"},   {"Eye Color": "Pink Small"},
                             {"Eye Color": "Purple Big"}, {"Eye Color": "Purple Small"},
@@ -70,48 +228,211 @@ bottomsTraits            = [{"Bottom Lid": "High"}, {"Bottom Lid": "Low"}, {"Bot
 topsProbabilities        = [30, 30, 40]
 topsTraits               = [{"Top Lid": "High"}, {"Top Lid": "Low"}, {"Top Lid": "Tilted"}]
 
+layersConfig = [("background", backgroundsProbabilities, backgroundsTraits),
+                ("ball",       ballsProbabilities,       ballsTraits      ),
+                ("eye_color",  eyesProbabilities,        eyesTraits       ),
+                ("iris",       irissProbabilities,       irissTraits      ),
+                ("shine",      shinesProbabilities,      shinesTraits     ),
+                ("bottom_lid", bottomsProbabilities,     bottomsTraits    ),
+                ("top_lid",    topsProbabilities,        topsTraits       )]
+
+def getLayers(inputFolder: str):
+    return [(getFilesInFolder(os.path.join(inputFolder, folder), ".png"), probabilities, traits) for (folder, probabilities, traits) in layersConfig]
+
+# ==============================================================================
+# Every token gets its own random generator seeded from (collection seed, index),
+# so the output doesn't depend on the number of workers or on the order of rendering.
+def getTokenRandom(seed: str, index: int):
+    digest = hashlib.sha256(f"{seed}:{index}".encode()).digest()
+    return random.Random(int.from_bytes(digest, "big"))
+
+def pickLayers(layers, rng: random.Random):
+    return [rng.choices(range(0, len(files)), weights=probabilities)[0] for (files, probabilities, _) in layers]
+
 # ==============================================================================
-# 
-for i in range(0, 200):
-    layers = []
-
-    layers.append(backgrounds.index(random.choices(backgrounds, weights=backgroundsProbabilities)[0]))
-    layers.append(balls.index      (random.choices(balls,       weights=ballsProbabilities      )[0]))
-    layers.append(eyes.index       (random.choices(eyes,        weights=eyesProbabilities       )[0]))
-    layers.append(iriss.index      (random.choices(iriss,       weights=irissProbabilities      )[0]))
-    layers.append(shines.index     (random.choices(shines,      weights=shinesProbabilities     )[0]))
-    layers.append(bottoms.index    (random.choices(bottoms,     weights=bottomsProbabilities    )[0]))
-    layers.append(tops.index       (random.choices(tops,        weights=topsProbabilities       )[0]))
-
-    result = Image.open(backgrounds[layers[0]]).convert('RGBA')
-
-    with Image.open(balls  [layers[1]]).convert('RGBA') as foreground:
-        result.alpha_composite(foreground, (0, 0), (0, 0))
-    with Image.open(eyes   [layers[2]]).convert('RGBA') as foreground:
-        result.alpha_composite(foreground, (0, 0), (0, 0))
-    with Image.open(iriss  [layers[3]]).convert('RGBA') as foreground:
-        result.alpha_composite(foreground, (0, 0), (0, 0))
-    with Image.open(shines [layers[4]]).convert('RGBA') as foreground:
-        result.alpha_composite(foreground, (0, 0), (0, 0))
-    with Image.open(bottoms[layers[5]]).convert('RGBA') as foreground:
-        result.alpha_composite(foreground, (0, 0), (0, 0))
-    with Image.open(tops   [layers[6]]).convert('RGBA') as foreground:
-        result.alpha_composite(foreground, (0, 0), (0, 0))
-    
-    result.save(os.path.join("assets_generated", f"{i}.png"))
+# Unique combinations for all indexes, picked in index order so the result only depends on the seed.
+# A repeated combination is drawn again from the same token generator (rejection sampling keeps
+# the relative weights of unused combinations); after UNIQUE_ATTEMPTS misses the token picks
+# directly among the combinations that are left, with the same weights.
+UNIQUE_ATTEMPTS = 1000
+
+def getCombinationsNumber(layers):
+    result = 1
+    for (files, probabilities, _) in layers:
+        result *= len([weight for weight in probabilities[:len(files)] if weight > 0])
+    return result
+
+def _pickRemaining(layers, used, rng: random.Random):
+    combinations = [()]
+    weights      = [1]
+    for (files, probabilities, _) in layers:
+        combinations = [combination + (choice,) for combination in combinations for choice in range(0, len(files))]
+        weights      = [weight * probability for weight in weights for probability in probabilities[:len(files)]]
+    remaining = [(combination, weight) for combination, weight in zip(combinations, weights) if combination not in used and weight > 0]
+    return rng.choices([combination for (combination, _) in remaining], weights=[weight for (_, weight) in remaining])[0]
+
+def pickUniqueLayers(layers, seed: str, count: int):
+    if count > getCombinationsNumber(layers):
+        raise ValueError(f"Only {getCombinationsNumber(layers)} unique combinations are possible, {count} requested")
+
+    used   = set()
+    result = []
+    for index in range(0, count):
+        rng    = getTokenRandom(seed, index)
+        picked = tuple(pickLayers(layers, rng))
+        for _ in range(0, UNIQUE_ATTEMPTS):
+            if picked not in used:
+                break
+            picked = tuple(pickLayers(layers, rng))
+        else:
+            picked = _pickRemaining(layers, used, rng)
+        used.add(picked)
+        result.append(picked)
+    return result
+
+# Target vs achieved share of every trait, in percents
+def getTraitsDistribution(layers, pickedList):
+    report = []
+    for n, (files, probabilities, traits) in enumerate(layers):
+        total = sum(probabilities[:len(files)])
+        for choice in range(0, len(files)):
+            achieved = len([picked for picked in pickedList if picked[n] == choice])
+            report.append((traits[choice], 100 * probabilities[choice] / total, 100 * achieved / max(len(pickedList), 1)))
+    return report
+
+def getLayerPaths(layers, picked):
+    return [files[choice] for (files, _, _), choice in zip(layers, picked)]
+
+def saveToken(layers, picked, image, outputFolder: str, index: int):
+    image.save(os.path.join(outputFolder, f"{index}.png"))
 
     meta = defaultMeta.copy()
-    meta["name"] = meta["name"] + str(i)
-
-    meta["attributes"] = []
-    meta["attributes"].append(backgroundsTraits[layers[0]])
-    meta["attributes"].append(ballsTraits      [layers[1]])
-    meta["attributes"].append(eyesTraits       [layers[2]])
-    meta["attributes"].append(irissTraits      [layers[3]])
-    meta["attributes"].append(shinesTraits     [layers[4]])
-    meta["attributes"].append(bottomsTraits    [layers[5]])
-    meta["attributes"].append(topsTraits       [layers[6]])
-
-    jsonFile = os.path.join("assets_generated", f"{i}.json")
+    meta["name"]       = meta["name"] + str(index)
+    meta["attributes"] = [traits[choice] for (_, _, traits), choice in zip(layers, picked)]
+
+    jsonFile = os.path.join(outputFolder, f"{index}.json")
     with open(jsonFile, "w") as fp:
         json.dump(meta, fp)
+
+# ==============================================================================
+# Process pool workers keep their own layer store and composite cache (or compositor) for the whole run
+RENDER_CHUNK = 16
+_WORKER      = {}
+
+def _initWorker(inputFolder: str, outputFolder: str, backend: str):
+    _WORKER["layers"]  = getLayers(inputFolder)
+    _WORKER["output"]  = outputFolder
+    _WORKER["backend"] = backend
+    if backend == "numpy":
+        _WORKER["compositor"] = NumpyCompositor(LayerStore(), batch=RENDER_CHUNK)
+    else:
+        _WORKER["cache"]      = CompositeCache(LayerStore())
+
+# Takes a list of (index, picked layers), at most RENDER_CHUNK long
+def _renderIndexes(tokens):
+    layers = _WORKER["layers"]
+    if _WORKER["backend"] == "numpy":
+        images = _WORKER["compositor"].renderBatch([getLayerPaths(layers, picked) for (_, picked) in tokens])
+    else:
+        images = [_WORKER["cache"].render(getLayerPaths(layers, picked), picked) for (_, picked) in tokens]
+
+    for (index, picked), image in zip(tokens, images):
+        saveToken(layers, picked, image, _WORKER["output"], index)
+    return len(tokens)
+
+# ==============================================================================
+# Renders tokens in memory (without PNG encoding) with every backend in this process,
+# returns backend -> (tokens per second per core, identical to plain PIL for every token).
+def benchmark(layers, tokens):
+    pathsList = [getLayerPaths(layers, picked) for (_, picked) in tokens]
+    expected  = []
+    results   = {}
+
+    started = time.perf_counter()
+    store   = LayerStore()
+    for paths in pathsList:
+        image = store.get(paths[0]).copy()
+        for path in paths[1:]:
+            image.alpha_composite(store.get(path), (0, 0), (0, 0))
+        expected.append(image)
+    results["pil"] = (time.perf_counter() - started, True)
+
+    started  = time.perf_counter()
+    cache    = CompositeCache(LayerStore())
+    rendered = [cache.render(paths, picked) for (paths, (_, picked)) in zip(pathsList, tokens)]
+    elapsed  = time.perf_counter() - started
+    results["pil-cache"] = (elapsed, all(image.tobytes() == expected[n].tobytes() for n, image in enumerate(rendered)))
+
+    if numpy is not None:
+        elapsed    = 0
+        compositor = NumpyCompositor(LayerStore(), batch=RENDER_CHUNK)
+        identical  = True
+        for start in range(0, len(pathsList), RENDER_CHUNK):
+            started  = time.perf_counter()
+            images   = compositor.renderBatch(pathsList[start:start + RENDER_CHUNK])
+            elapsed += time.perf_counter() - started
+            for n, image in enumerate(images):
+                identical = identical and image.tobytes() == expected[start + n].tobytes()
+        results["numpy"] = (elapsed, identical)
+
+    return {name: (len(tokens) / max(seconds, 1e-9), identical) for name, (seconds, identical) in results.items()}
+
+# ==============================================================================
+#
+@click.command()
+@click.option("-n", "--count",   "count",   type=int, default=200,                help="Number of tokens to generate.")
+@click.option("-s", "--seed",    "seed",    type=str, default=None,               help="Collection seed, the same seed generates the same collection.")
+@click.option("-w", "--workers", "workers", type=int, default=os.cpu_count() or 1, help="Number of worker processes.")
+@click.option("-i", "--input",   "input",   type=str, default="./assets_raw",     help="Folder with layer folders.")
+@click.option("-o", "--output",  "output",  type=str, default="assets_generated", help="Folder for generated N.png/N.json.")
+@click.option("-b", "--backend", "backend", type=click.Choice(["pil", "numpy"]), default="pil", help="Compositing backend, \"numpy\" requires numpy.")
+@click.option("--benchmark",     "bench",   is_flag=True, default=False,          help="Only measure compositing throughput per core of every backend.")
+def generate(count, seed, workers, input, output, backend, bench):
+    """
+    Generates a collection of layered images with their metadata.
+    """
+    if seed is None:
+        seed = os.urandom(16).hex()
+        click.echo(f"Collection seed: {seed}")
+    if backend == "numpy" and numpy is None:
+        click.echo(f"ERROR! NumPy backend requires numpy to be installed.")
+        return
+
+    started = time.time()
+    layers  = getLayers(input)
+    try:
+        tokens = list(enumerate(pickUniqueLayers(layers, seed, count)))
+    except ValueError as error:
+        click.echo(f"ERROR! {error}")
+        return
+
+    if bench:
+        click.echo(f"{'Backend':<10} {'Tokens/s':>9} {'Identical':>10}")
+        for name, (perSecond, identical) in benchmark(layers, tokens).items():
+            click.echo(f"{name:<10} {perSecond:>9.1f} {'yes' if identical else 'NO':>10}")
+        if numpy is None:
+            click.echo(f"numpy is not installed, NumPy backend is skipped.")
+        return
+
+    os.makedirs(output, exist_ok=True)
+    chunks  = [tokens[start:start + RENDER_CHUNK] for start in range(0, count, RENDER_CHUNK)]
+    if workers <= 1:
+        _initWorker(input, output, backend)
+        for chunk in chunks:
+            _renderIndexes(chunk)
+    else:
+        with ProcessPoolExecutor(max_workers=workers, initializer=_initWorker, initargs=(input, output, backend)) as executor:
+            with click.progressbar(length=count, label="Generating") as bar:
+                for done in executor.map(_renderIndexes, chunks):
+                    bar.update(done)
+
+    click.echo(f"Generated {count} unique tokens in {time.time() - started:.1f}s.")
+    click.echo(f"{'Trait':<32} {'Target':>8} {'Achieved':>9}")
+    for (trait, target, achieved) in getTraitsDistribution(layers, [picked for (_, picked) in tokens]):
+        name = ", ".join(f"{key}: {value}" for key, value in trait.items())
+        click.echo(f"{name:<32} {target:>7.1f}% {achieved:>8.1f}%")
+
+# ==============================================================================
+#
+if __name__ == "__main__":
+    generate()
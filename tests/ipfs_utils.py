@@ -0,0 +1,246 @@
+#!/usr/bin/env python3
+
+# ==============================================================================
+#
+import os
+import json
+import mmap
+import hashlib
+import threading
+from   concurrent.futures import ThreadPoolExecutor, as_completed
+from   pinatapy           import PinataPy
+
+# ==============================================================================
+#
+IPFS_GATEWAY   = "https://gateway.pinata.cloud/ipfs/"
+UPLOAD_JOURNAL = ".ipfs_journal.jsonl"
+UPLOAD_WORKERS = 8
+HASH_INDEX     = os.path.join(os.path.expanduser("~"), ".ipfs_hash_index")  # + ".<account>.jsonl"
+
+# go-ipfs defaults that Pinata uses for CIDv0: 256KiB chunks, balanced DAG with 174 links per node
+CID_CHUNK_SIZE = 262144
+CID_MAX_LINKS  = 174
+BASE58_ALPHABET = "123456789ABCDEFGHJKLMNPQRSTUVWXYZabcdefghijkmnopqrstuvwxyz"
+
+# ==============================================================================
+# Append-only journal of finished pins, one {keyField, "IpfsHash", ["sha256"]} JSON per line.
+# Every entry is flushed and fsynced, so a crash loses at most the uploads that were
+# in flight; a torn last line is ignored on load.
+# Keyed by file name for the per-folder upload journal and by sha256 for HASH_INDEX.
+# File name entries also keep the sha256 of the pinned contents: when the file is
+# regenerated, get() with the new sha256 ignores the old entry and the file is pinned again.
+class UploadJournal(object):
+    def __init__(self, path: str, keyField: str = "file"):
+        self.PATH    = path
+        self.KEY     = keyField
+        self.ENTRIES = {}
+        self._lock   = threading.Lock()
+
+        if os.path.exists(path):
+            with open(path) as fp:
+                for line in fp:
+                    try:
+                        entry = json.loads(line)
+                    except ValueError:
+                        continue
+                    if self.KEY in entry and "IpfsHash" in entry:
+                        self.ENTRIES[entry[self.KEY]] = (entry["IpfsHash"], entry.get("sha256"))
+
+        self._fp = open(path, "a")
+
+    # With "sha256" an entry counts only if it was recorded for the same contents
+    def get(self, key: str, sha256: str = None):
+        with self._lock:
+            entry = self.ENTRIES.get(key)
+        if entry is None or (sha256 is not None and entry[1] != sha256):
+            return None
+        return entry[0]
+
+    def add(self, key: str, ipfsHash: str, sha256: str = None):
+        with self._lock:
+            if self.ENTRIES.get(key) == (ipfsHash, sha256):
+                return
+            entry = {self.KEY: key, "IpfsHash": ipfsHash}
+            if sha256 is not None:
+                entry["sha256"] = sha256
+            self._fp.write(json.dumps(entry) + "\n")
+            self._fp.flush()
+            os.fsync(self._fp.fileno())
+            self.ENTRIES[key] = (ipfsHash, sha256)
+
+    def close(self):
+        self._fp.close()
+
+# ==============================================================================
+# Minimal protobuf writer for dag-pb/UnixFS nodes
+def _varint(value: int):
+    result = bytearray()
+    while True:
+        byte  = value & 0x7F
+        value = value >> 7
+        if value:
+            result.append(byte | 0x80)
+        else:
+            result.append(byte)
+            return bytes(result)
+
+def _pbBytes(field: int, data: bytes):
+    return _varint(field << 3 | 2) + _varint(len(data)) + data
+
+def _pbVarint(field: int, value: int):
+    return _varint(field << 3) + _varint(value)
+
+def _base58(data: bytes):
+    number = int.from_bytes(data, "big")
+    result = ""
+    while number > 0:
+        number, rem = divmod(number, 58)
+        result = BASE58_ALPHABET[rem] + result
+    return "1" * (len(data) - len(data.lstrip(b"\x00"))) + result
+
+# Returns (multihash, encoded block size, cumulative DAG size, file size) of a node
+def _dagNode(links, unixfs: bytes, fileSize: int):
+    block = b""
+    for (multihash, _, dagSize, _) in links:
+        block += _pbBytes(2, _pbBytes(1, multihash) + _pbBytes(2, b"") + _pbVarint(3, dagSize))
+    block += _pbBytes(1, unixfs)
+    return (b"\x12\x20" + hashlib.sha256(block).digest(), len(block), len(block) + sum(link[2] for link in links), fileSize)
+
+def _dagLeaf(chunk):
+    unixfs = _pbVarint(1, 2) + (_pbBytes(2, chunk) if len(chunk) > 0 else b"") + _pbVarint(3, len(chunk))
+    return _dagNode([], unixfs, len(chunk))
+
+def _dagParent(children):
+    fileSize = sum(child[3] for child in children)
+    unixfs   = _pbVarint(1, 2) + _pbVarint(3, fileSize) + b"".join(_pbVarint(4, child[3]) for child in children)
+    return _dagNode(children, unixfs, fileSize)
+
+# ==============================================================================
+# Local CIDv0 of a file as "ipfs add" (and Pinata) would compute it with default settings.
+def calculateCID(data):
+    nodes = [_dagLeaf(data[offset:offset + CID_CHUNK_SIZE]) for offset in range(0, len(data), CID_CHUNK_SIZE)]
+    if len(nodes) == 0:
+        nodes = [_dagLeaf(b"")]
+
+    while len(nodes) > 1:
+        nodes = [_dagParent(nodes[i:i + CID_MAX_LINKS]) for i in range(0, len(nodes), CID_MAX_LINKS)]
+    return _base58(nodes[0][0])
+
+# Returns (sha256, CIDv0) of a file, reading it through mmap so that big media isn't copied around.
+def hashFile(path: str):
+    with open(path, "rb") as fp:
+        if os.fstat(fp.fileno()).st_size == 0:
+            return (hashlib.sha256(b"").hexdigest(), calculateCID(b""))
+        with mmap.mmap(fp.fileno(), 0, access=mmap.ACCESS_READ) as data:
+            return (hashlib.sha256(data).hexdigest(), calculateCID(data))
+
+# hashlib releases the GIL on big buffers, threads are enough to keep all cores busy.
+def hashFilesConcurrently(paths, workers: int = UPLOAD_WORKERS):
+    with ThreadPoolExecutor(max_workers=workers) as executor:
+        return dict(zip(paths, executor.map(hashFile, paths)))
+
+# ==============================================================================
+# Pins belong to a Pinata account, so every API key gets its own sha256 -> CID index.
+def getHashIndexPath(apiKey: str, prefix: str = HASH_INDEX):
+    return prefix + "." + hashlib.sha256(apiKey.encode("utf-8")).hexdigest()[:16] + ".jsonl"
+
+# Checks Pinata for an existing pin of a locally computed CID before sending the bytes.
+def _pinUnlessPinned(pinata: PinataPy, path: str, cid: str):
+    result = pinata.pin_list({"hashContains": cid, "status": "pinned"})
+    for row in result.get("rows", []):
+        if row.get("ipfs_pin_hash") == cid:
+            return {"IpfsHash": cid}
+    return pinata.pin_file_to_ipfs(path)
+
+# ==============================================================================
+# path -> (sha256, CIDv0), "digests" already known for some paths (e.g. from asset_manifest) are reused
+def _getDigests(paths, digests = None, workers: int = UPLOAD_WORKERS):
+    known = {} if digests is None else {path: digests[path] for path in paths if path in digests}
+    known.update(hashFilesConcurrently([path for path in paths if path not in known], workers))
+    return known
+
+# ==============================================================================
+# Pins files with a bounded pool of workers and records every success in the journal
+# right away with the sha256 of the file; files journaled with the same contents are skipped.
+# With a content index (sha256 -> CID) files with known contents are resolved locally and
+# identical files are pinned only once; "digests" can pass (sha256, CID) already known for a path.
+# "checkPinned" asks Pinata (one pinList call per file) whether index hits are still pinned
+# and whether new contents are pinned already, instead of trusting the index and uploading.
+# Stops submitting new work on the first error and returns the list of (path, response) errors.
+def pinFilesConcurrently(pinata: PinataPy, paths, journal: UploadJournal, workers: int = UPLOAD_WORKERS, onProgress = None, index: UploadJournal = None, digests = None, checkPinned: bool = False):
+    known   = _getDigests(paths, digests, workers)
+    pending = [path for path in paths if journal.get(os.path.basename(path), known[path][0]) is None]
+    errors  = []
+
+    if onProgress is not None and len(pending) < len(paths):
+        onProgress(len(paths) - len(pending))
+
+    # Group by contents, one upload per distinct sha256
+    groups = {}
+    if index is not None:
+        for path in pending:
+            (sha, cid) = known[path]
+            ipfsHash   = index.get(sha)
+            if ipfsHash is not None and not checkPinned:
+                journal.add(os.path.basename(path), ipfsHash, sha)
+                if onProgress is not None:
+                    onProgress(1)
+            else:
+                groups.setdefault(sha, (cid, []))[1].append(path)
+    else:
+        for path in pending:
+            groups[path] = (None, [path])
+
+    executor = ThreadPoolExecutor(max_workers=workers)
+    try:
+        futures = {}
+        for key, (cid, group) in groups.items():
+            if cid is not None and checkPinned:
+                future = executor.submit(_pinUnlessPinned, pinata, group[0], cid)
+            else:
+                future = executor.submit(pinata.pin_file_to_ipfs, group[0])
+            futures[future] = key
+
+        for future in as_completed(futures):
+            key        = futures[future]
+            cid, group = groups[key]
+            if future.cancelled():
+                continue
+            try:
+                result = future.result()
+            except Exception as error:
+                result = {"error": str(error)}
+
+            if "IpfsHash" in result:
+                if index is not None:
+                    index.add(key, result["IpfsHash"])
+                for path in group:
+                    journal.add(os.path.basename(path), result["IpfsHash"], known[path][0])
+            else:
+                if len(errors) == 0:
+                    executor.shutdown(wait=False, cancel_futures=True)
+                errors.append((group[0], result))
+
+            if onProgress is not None:
+                onProgress(len(group))
+    finally:
+        executor.shutdown(wait=True)
+
+    return errors
+
+# ==============================================================================
+# Pins all files as one IPFS directory in a single request and journals every file as
+# "<dirCID>/<basename>", so the journal entries can be used as URIs the same way as single pins.
+# Returns the list of (path, response) errors, as pinFilesConcurrently does.
+def pinDirectory(pinata: PinataPy, paths, journal: UploadJournal, directoryName: str, digests = None):
+    known  = _getDigests(paths, digests)
+    result = pinata.pin_directory_to_ipfs(paths, directoryName, {"pinataMetadata": {"name": directoryName}})
+    if "IpfsHash" not in result:
+        return [(directoryName, result)]
+
+    for path in paths:
+        journal.add(os.path.basename(path), result["IpfsHash"] + "/" + os.path.basename(path), known[path][0])
+    return []
+
+# ==============================================================================
+#
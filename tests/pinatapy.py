@@ -7,6 +7,8 @@
 """Non-official Python library for Pinata.cloud"""
 
 import os
+import json
+import uuid
 import typing as tp
 
 import requests
@@ -20,6 +22,73 @@ Headers = tp.Dict[str, str]
 API_ENDPOINT: str = "https://api.pinata.cloud/"
 
 
+class _MultipartStream:
+    """
+    multipart/form-data body that requests reads chunk by chunk: every file is opened only while
+    its part is being sent, so big directories are neither limited by the open file limit
+    nor held in memory as a whole
+    """
+
+    def __init__(self, fields: tp.Dict[str, str], files: tp.List[tp.Tuple[str, str, str]]) -> None:
+        self.boundary: str = uuid.uuid4().hex
+        # bytes are sent as is, str is the path of a file to send
+        self._parts: tp.List[tp.Union[bytes, str]] = []
+        for name, value in fields.items():
+            self._parts.append(self._header(name) + b"\r\n" + value.encode("utf-8") + b"\r\n")
+        for name, filename, path in files:
+            self._parts.append(self._header(name, filename) + b"Content-Type: application/octet-stream\r\n\r\n")
+            self._parts.append(path)
+            self._parts.append(b"\r\n")
+        self._parts.append(("--" + self.boundary + "--\r\n").encode("utf-8"))
+
+        self._length: int = sum(len(part) if isinstance(part, bytes) else os.path.getsize(part) for part in self._parts)
+        self._index: int = 0
+        self._offset: int = 0
+        self._handle: tp.Optional[tp.BinaryIO] = None
+
+    def _header(self, name: str, filename: tp.Optional[str] = None) -> bytes:
+        disposition = 'form-data; name="%s"' % name.replace('"', "%22")
+        if filename is not None:
+            disposition += '; filename="%s"' % filename.replace('"', "%22")
+        return ("--" + self.boundary + "\r\nContent-Disposition: " + disposition + "\r\n").encode("utf-8")
+
+    @property
+    def content_type(self) -> str:
+        return "multipart/form-data; boundary=" + self.boundary
+
+    def __len__(self) -> int:
+        return self._length
+
+    def read(self, size: int = -1) -> bytes:
+        wanted = self._length if size is None or size < 0 else size
+        chunks: tp.List[bytes] = []
+        while wanted > 0 and self._index < len(self._parts):
+            part = self._parts[self._index]
+            if isinstance(part, bytes):
+                data = part[self._offset : self._offset + wanted]
+                self._offset += len(data)
+                done = self._offset >= len(part)
+            else:
+                if self._handle is None:
+                    self._handle = open(part, "rb")
+                data = self._handle.read(wanted)
+                done = len(data) == 0
+                if done:
+                    self._handle.close()
+                    self._handle = None
+            if done:
+                self._index += 1
+                self._offset = 0
+            chunks.append(data)
+            wanted -= len(data)
+        return b"".join(chunks)
+
+    def close(self) -> None:
+        if self._handle is not None:
+            self._handle.close()
+            self._handle = None
+
+
 class PinataPy:
     """A pinata api client session object"""
 
@@ -67,6 +136,32 @@ class PinataPy:
         response: requests.Response = requests.post(url=url, files=files, headers=headers)
         return response.json() if response.ok else self._error(response)  # type: ignore
 
+    def pin_directory_to_ipfs(
+        self, paths_to_files: tp.List[str], directory_name: str, options: tp.Optional[OptionsDict] = None
+    ) -> ResponsePayload:
+        """
+        Pin a list of files as one IPFS directory in a single request, every file is sent as
+        "<directory_name>/<basename>" so the returned IpfsHash is the CID of the directory
+        More: https://docs.pinata.cloud/api-pinning/pin-file
+        """
+        url: str = API_ENDPOINT + "pinning/pinFileToIPFS"
+        data: tp.Dict[str, str] = {}
+        if options is not None:
+            if "pinataMetadata" in options:
+                data["pinataMetadata"] = json.dumps(options["pinataMetadata"])
+            if "pinataOptions" in options:
+                data["pinataOptions"] = json.dumps(options["pinataOptions"])
+
+        body = _MultipartStream(
+            data, [("file", directory_name + "/" + os.path.basename(path), path) for path in paths_to_files]
+        )
+        headers: Headers = dict(self._auth_headers, **{"Content-Type": body.content_type})
+        try:
+            response: requests.Response = requests.post(url=url, data=body, headers=headers)
+        finally:
+            body.close()
+        return response.json() if response.ok else self._error(response)  # type: ignore
+
     def pin_hash_to_ipfs(self, hash_to_pin: str, options: tp.Optional[OptionsDict] = None) -> ResponsePayload:
         """WARNING: This Pinata API method is deprecated. Use 'pin_hash_to_ipfs' instead"""
         url: str = API_ENDPOINT + "pinning/addHashToPinQueue"
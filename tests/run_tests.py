@@ -17,6 +17,7 @@ from   contract_Distributor      import Distributor
 from   contract_LiquidToken      import LiquidToken
 from   contract_LiquidCollection import LiquidCollection
 from   contract_DistributorDebot import DistributorDebot
+from   freeton_sandbox           import SandboxClient
 
 #SERVER_ADDRESS = "https://net.ton.dev"
 SERVER_ADDRESS = "https://gql.custler.net"
@@ -24,7 +25,7 @@ SERVER_ADDRESS = "https://gql.custler.net"
 # ==============================================================================
 #
 def getClient():
-    return TonClient(config=ClientConfig(network=NetworkConfig(server_address=SERVER_ADDRESS)))
+    return getEverClient(testnet=True, customServer=SERVER_ADDRESS)
 
 # ==============================================================================
 # 
@@ -50,6 +51,11 @@ for _, arg in enumerate(sys.argv[1:]):
         freeton_utils.MSIG_GIVER = arg[13:]
         sys.argv.remove(arg)
 
+    if arg == "--sandbox":
+        
+        freeton_utils.BACKEND = SandboxClient()
+        sys.argv.remove(arg)
+
 # ==============================================================================
 # EXIT CODE FOR SINGLE-MESSAGE OPERATIONS
 # we know we have only 1 internal message, that's why this wrapper has no filters
@@ -68,7 +74,7 @@ def _unwrapMessagesAndPrint(result):
     pprint(msgs)
 
 def _getExitCode(msgIdArray):
-    msgArray     = unwrapMessages(getClient(), msgIdArray, _getAbiArray())
+    msgArray     = unwrapMessages(getClient(), msgIdArray, _getAbiArray(), maxDepth=0)
     if msgArray != "":
         realExitCode = msgArray[0]["TX_DETAILS"]["compute"]["exit_code"]
     else:
@@ -176,7 +182,7 @@ print("balance:", authority.getBalance())
 result = collection.createNFT(msig=authority, 
                               ownerAddress=authority.ADDRESS, 
                               creatorAddress=authority.ADDRESS, 
-                              metadata=json.dumps(defaultMeta), 
+                              metadata=dumpMetadata(defaultMeta), 
                               metadataAuthorityAddress=authority.ADDRESS)
 
 _unwrapMessages(result)
@@ -214,7 +220,7 @@ metaList = []
 for i in range(0, 20):
     meta = defaultMeta.copy()
     meta["name"] = meta["name"] + str(i)
-    metaList.append(json.dumps(meta))
+    metaList.append(dumpMetadata(meta))
 
 #print(metaList)
 
@@ -21,7 +21,7 @@ SERVER_ADDRESS = "https://net.ton.dev"
 # ==============================================================================
 #
 def getClient():
-    return TonClient(config=ClientConfig(network=NetworkConfig(server_address=SERVER_ADDRESS)))
+    return getEverClient(testnet=True, customServer=SERVER_ADDRESS)
 
 # ==============================================================================
 # 
@@ -65,7 +65,7 @@ def _unwrapMessagesAndPrint(result):
     pprint(msgs)
 
 def _getExitCode(msgIdArray):
-    msgArray     = unwrapMessages(getClient(), msgIdArray, _getAbiArray())
+    msgArray     = unwrapMessages(getClient(), msgIdArray, _getAbiArray(), maxDepth=0)
     if msgArray != "":
         realExitCode = msgArray[0]["TX_DETAILS"]["compute"]["exit_code"]
     else:
@@ -122,7 +122,7 @@ metaList = []
 for i in range(0, 20):
     meta = defaultMeta.copy()
     meta["name"] = meta["name"] + str(i)
-    metaList.append(json.dumps(meta))
+    metaList.append(dumpMetadata(meta))
 
 #print(metaList)
 